@@ -1,2 +1,33 @@
-from binary_formats.reader import ReadBinFIle as load_file
-from binary_formats.formats import *
\ No newline at end of file
+'''
+the names of the package are imported the first time they are used (PEP 562 module __getattr__), so importing the
+package costs little more than numpy and a module or an optional dependency is only imported when it is needed.
+'''
+import importlib
+
+# name: (module, name in the module)
+_LAZY = {'load_file': ('binary_formats.reader', 'ReadBinFIle'),
+         'ReadBinFIle': ('binary_formats.reader', 'ReadBinFIle'),
+         'DetectFormat': ('binary_formats.reader', 'DetectFormat'),
+         'load_files': ('binary_formats.batch', 'load_files'),
+         'FileFollower': ('binary_formats.follow', 'FileFollower')}
+# everything else, the format classes, FORMATS etc., is looked up in formats
+_FORMATS_MODULE = 'binary_formats.formats'
+
+__all__ = ['load_file', 'FORMATS', 'register', 'BinaryAbc', 'EM3000', 'SeapathBin11', 'SeapathBin26', 'VmmMruBin',
+           'Kmbinary', 'sbet', 'PfreeHeave']
+
+
+def __getattr__(name):
+    if name.startswith('__'):
+        raise AttributeError(name)
+    module, attribute = _LAZY.get(name, (_FORMATS_MODULE, name))
+    try:
+        value = getattr(importlib.import_module(module), attribute)
+    except AttributeError:
+        raise AttributeError("module 'binary_formats' has no attribute '%s'" % name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY) | set(__all__))
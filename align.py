@@ -0,0 +1,176 @@
+import numpy as np
+
+# angle columns that wrap around, with the lower end of their range. they are interpolated along the shortest arc
+ANGLE_FIELDS = {'heading': 0.0, 'Heading': 0.0, 'Yaw': -180.0}
+
+
+def column_names(array):
+    '''names of the columns of a converted array, or of a dict of columns (zero_copy)'''
+    return list(array) if isinstance(array, dict) else list(array.dtype.names)
+
+
+def rows(array, first, last=None):
+    '''the samples first to last of a converted array or a dict of columns'''
+    if isinstance(array, dict):
+        return dict((name, column[first:last]) for name, column in array.items())
+    return array[first:last]
+
+
+def concatenate(chunks):
+    if isinstance(chunks[0], dict):
+        return dict((name, np.concatenate([chunk[name] for chunk in chunks])) for name in chunks[0])
+    return np.concatenate(chunks)
+
+
+def clock(start, end, rate, chunk_size=2**16):
+    '''
+    target time line from start to end (not included) at rate samples pr. second, yielded in chunks.
+    the times are computed as start + i / rate so they do not drift.
+    '''
+    count = int(np.ceil((end - start) * rate))
+    for first in range(0, count, chunk_size):
+        yield start + np.arange(first, min(first + chunk_size, count)) / float(rate)
+
+
+def bracket(time, times):
+    '''
+    for every target time the index of the sample at or before it, the sample after it, the weight of the sample
+    after it and whether it is outside of the samples. time must be increasing.
+    '''
+    count = len(time)
+    index = np.searchsorted(time, times, side='right') - 1
+    np.clip(index, 0, max(count - 1, 0), out=index)
+    upper = np.minimum(index + 1, max(count - 1, 0))
+    if count == 0:
+        return index, upper, np.zeros(len(times)), np.ones(len(times), dtype=bool)
+    before = time[index]
+    span = time[upper] - before
+    weight = np.zeros(len(times))
+    np.divide(times - before, span, out=weight, where=span > 0)
+    outside = (times < time[0]) | (times > time[-1])
+    return index, upper, weight, outside
+
+
+def interpolate_column(column, index, upper, weight, outside, low=None):
+    '''
+    linear interpolation of one column, NaN outside of the samples. low is the lower end of the range of an angle
+    column in degrees, the difference is then taken the short way around. columns that are not floats (status,
+    counters) hold the sample at or before the target time.
+    '''
+    if column.dtype.kind != 'f':
+        return column[index]
+    before = column[index]
+    diff = column[upper] - before
+    if low is not None:
+        diff = (diff + 180.0) % 360.0 - 180.0
+    value = before + weight * diff
+    if low is not None:
+        value = (value - low) % 360.0 + low
+    value[outside] = np.nan
+    return value
+
+
+def interpolate(array, times, fields=None, time_field='utc_time', angles=ANGLE_FIELDS, max_gap=None):
+    '''
+    resample a converted array, or a dict of columns, onto the target times.
+    :param fields: columns to interpolate, all but the time column if None
+    :param max_gap: target times between samples further apart than this many seconds are NaN
+    :return: structured array with the time column and the fields, in native byte order
+    '''
+    times = np.asarray(times, dtype=np.float64)
+    if fields is None:
+        fields = [name for name in column_names(array) if name != time_field]
+    time = np.ascontiguousarray(array[time_field], dtype=np.float64)
+    index, upper, weight, outside = bracket(time, times)
+    if max_gap is not None and len(time):
+        outside |= time[upper] - time[index] > max_gap
+    dtype = [(time_field, 'f8')] + [(name, array[name].dtype.newbyteorder('=')) for name in fields]
+    out = np.empty(len(times), dtype=dtype)
+    out[time_field] = times
+    for name in fields:
+        out[name] = interpolate_column(array[name], index, upper, weight, outside, angles.get(name))
+    return out
+
+
+def merge_dtype(arrays, fields, time_field):
+    dtype = [(time_field, 'f8')]
+    for source, array in arrays.items():
+        names = fields.get(source) if fields else None
+        if names is None:
+            names = [name for name in column_names(array) if name != time_field]
+        dtype += [('%s_%s' % (source, name), array[name].dtype.newbyteorder('=')) for name in names]
+    return np.dtype(dtype)
+
+
+def merge(arrays, times, fields=None, time_field='utc_time', angles=ANGLE_FIELDS, max_gap=None):
+    '''
+    interpolate several sensors onto one time line, the columns are named sensor_field.
+    all sensors must have their time on the same clock, ie. sbet seconds of the week must be made posix first.
+    :param arrays: {sensor name: converted array or dict of columns}
+    :param fields: {sensor name: list of columns}, all columns of a sensor that is not in it
+    '''
+    times = np.asarray(times, dtype=np.float64)
+    out = np.empty(len(times), dtype=merge_dtype(arrays, fields, time_field))
+    out[time_field] = times
+    for source, array in arrays.items():
+        names = fields.get(source) if fields else None
+        resampled = interpolate(array, times, names, time_field, angles, max_gap)
+        for name in resampled.dtype.names[1:]:
+            out['%s_%s' % (source, name)] = resampled[name]
+    return out
+
+
+class StreamAligner(object):
+    '''
+    merge that runs chunk by chunk, for data larger than memory. every source is an iterable of converted chunks
+    in time order (ReadBinFIle.iter_chunks, also with zero_copy), the target time line is an iterable of time
+    arrays (clock). only the samples needed to bracket the current target chunk are kept, the result is the same as
+    merge.
+    '''
+    def __init__(self, sources, fields=None, time_field='utc_time', angles=ANGLE_FIELDS, max_gap=None):
+        self.sources = dict((name, iter(chunks)) for name, chunks in sources.items())
+        self.fields = fields
+        self.time_field = time_field
+        self.angles = angles
+        self.max_gap = max_gap
+        self.buffers = dict((name, None) for name in self.sources)
+        self.exhausted = set()
+
+    def fill(self, name, last_time):
+        '''pull chunks until the buffer reaches past last_time or the source is empty'''
+        buffer = self.buffers[name]
+        chunks = [] if buffer is None else [buffer]
+        while name not in self.exhausted and (not chunks or chunks[-1][self.time_field][-1] <= last_time):
+            chunk = next(self.sources[name], None)
+            if chunk is None:
+                self.exhausted.add(name)
+            elif len(chunk[self.time_field]):
+                chunks.append(chunk)
+        if len(chunks) > 1:
+            buffer = concatenate(chunks)
+        elif chunks:
+            buffer = chunks[0]
+        self.buffers[name] = buffer
+        return buffer
+
+    def trim(self, name, last_time):
+        '''drop the samples that no later target time can need'''
+        buffer = self.buffers[name]
+        if buffer is not None and len(buffer[self.time_field]):
+            index = np.searchsorted(buffer[self.time_field], last_time, side='right') - 1
+            self.buffers[name] = rows(buffer, max(index, 0))
+
+    def align(self, times_chunks):
+        for times in times_chunks:
+            times = np.asarray(times, dtype=np.float64)
+            if not len(times):
+                continue
+            arrays = {}
+            for name in self.sources:
+                arrays[name] = self.fill(name, times[-1])
+            empty = [name for name, array in arrays.items() if array is None]
+            if empty:
+                raise ValueError('no data from %s' % ', '.join(empty))
+            yield merge(arrays, times, self.fields, self.time_field, self.angles, self.max_gap)
+            for name in self.sources:
+                self.trim(name, times[-1])
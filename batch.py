@@ -0,0 +1,125 @@
+import glob
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from binary_formats.reader import ReadBinFIle, fakeprogressbar
+
+
+def expand_files(files):
+    '''
+    a glob pattern or a list of file names, the pattern is expanded in sorted order.
+    '''
+    if isinstance(files, str):
+        return sorted(glob.glob(files))
+    return list(files)
+
+
+def load_to_npy(filename, out_path, dformat='Auto', date_time=None, chunk_size=2**18):
+    '''
+    worker function, streams one file through the ReadBinFIle pipeline into a .npy file so the converted array is
+    handed back through the file system instead of being pickled. memory use is bounded by the chunk size.
+    :return: the format name and the number of records
+    '''
+    reader = ReadBinFIle(filename, dformat, date_time=date_time, chunk_size=chunk_size)
+    reader.set_format()
+    dtype = reader.convert(np.zeros(0, dtype=reader.fmt.dtype)).dtype
+    # every record is at least the record size, the file is read once and the .npy cut down to the records found
+    most = os.path.getsize(filename) // np.dtype(reader.fmt.dtype).itemsize
+    out = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=(most,))
+    start = 0
+    for chunk in reader.iter_chunks():
+        out[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    out.flush()
+    del out
+    if start < most:
+        shrink_npy(out_path, start)
+    return reader.dformat, start
+
+
+def shrink_npy(path, count):
+    '''
+    keep the first count rows of a 1d .npy file. the header is written again with the new shape and padded to its
+    old length, so the data stays where it is.
+    '''
+    with open(path, 'r+b') as fobj:
+        version = np.lib.format.read_magic(fobj)
+        prefix = fobj.tell()
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else \
+            np.lib.format.read_array_header_2_0
+        dtype = read_header(fobj)[2]
+        offset = fobj.tell()
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+            np.lib.format.dtype_to_descr(dtype), count)
+        # the length of the header is kept in the bytes in front of it
+        width = 2 if version == (1, 0) else 4
+        fobj.seek(prefix + width)
+        fobj.write(header.ljust(offset - prefix - width - 1).encode('latin1') + b'\n')
+        fobj.truncate(offset + count * dtype.itemsize)
+
+
+def load_files(files, dformat='Auto', date_time=None, concatenate=True, max_workers=None,
+               progresbar=fakeprogressbar(), chunk_size=2**18, workdir=None, out=None):
+    '''
+    load many files in parallel with a process pool, each file runs the detect / parse / convert / make_time
+    pipeline in a worker.
+    :param files: list of file names or a glob pattern
+    :param date_time: one date_time for all files, or a list with one pr. file
+    :param concatenate: return one array with all files in order, else a list with one result pr. file
+    :param workdir: directory for the intermediate .npy files, a temporary directory is used and removed if None.
+    the per file arrays are memory maps of these files.
+    :param out: .npy file name to write the concatenated array to instead of memory
+    :return: {format name: array} like ReadBinFIle.run, or a list of them when concatenate is False. ValueError
+    when there are no files.
+    '''
+    pattern = files
+    files = expand_files(files)
+    if not files:
+        raise ValueError(('no files match %s' % pattern) if isinstance(pattern, str) else 'no files to load')
+    if isinstance(date_time, list):
+        if len(date_time) != len(files):
+            raise ValueError('date_time list must have one entry pr. file')
+        date_times = date_time
+    else:
+        date_times = [date_time] * len(files)
+    remove = workdir is None
+    workdir = tempfile.mkdtemp(prefix='binary_formats_') if remove else workdir
+    paths = [os.path.join(workdir, '%06d.npy' % i) for i in range(len(files))]
+    names = [None] * len(files)
+    progresbar.setRange(0, len(files))
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = dict((pool.submit(load_to_npy, filename, path, dformat, dt, chunk_size), i)
+                           for i, (filename, path, dt) in enumerate(zip(files, paths, date_times)))
+            for done, future in enumerate(as_completed(futures)):
+                names[futures[future]] = future.result()[0]
+                progresbar.setValue(done + 1)
+        arrays = [np.load(path, mmap_mode='r') for path in paths]
+        if not concatenate:
+            return [{name: array} for name, array in zip(names, arrays)]
+        if len(set(names)) > 1:
+            raise ValueError('files have different formats %s, load them with concatenate=False' % sorted(set(names)))
+        return {names[0]: concatenate_arrays(arrays, out)}
+    finally:
+        if remove:
+            # open memory maps stay valid after the files are unlinked on posix
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def concatenate_arrays(arrays, out=None):
+    '''
+    np.concatenate that can write to a .npy memory map, keeps the dtype of the input arrays.
+    '''
+    dtype = arrays[0].dtype if arrays else None
+    total = sum(len(array) for array in arrays)
+    if out is not None:
+        result = np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=(total,))
+    else:
+        result = np.empty(total, dtype=dtype)
+    start = 0
+    for array in arrays:
+        result[start:start + len(array)] = array
+        start += len(array)
+    return result
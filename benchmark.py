@@ -0,0 +1,204 @@
+'''
+benchmark of the read pipeline on synthetic files, pr. format, variant, file size and stage.
+every measurement runs in a fresh process so the peak memory is its own. results are written as json and can be
+compared with an earlier run:
+
+python -m binary_formats.benchmark --sizes 1M 100M 10G --out new.json --compare old.json
+'''
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from queue import Empty
+import numpy as np
+from binary_formats.formats import FORMATS
+from binary_formats.reader import ReadBinFIle
+from binary_formats import synthetic
+
+STAGES = ['parse', 'convert', 'make_time', 'mod_status', 'run', 'stream']
+UNITS = {'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+DATE_TIME = (2020, 9, 13, 1, 0, 0, 0.01)
+
+
+def parse_size(size):
+    '''1M, 100M, 10G etc. to bytes'''
+    size = str(size).upper().rstrip('B')
+    if size and size[-1] in UNITS:
+        return int(float(size[:-1]) * UNITS[size[-1]])
+    return int(size)
+
+
+def peak_rss():
+    '''peak resident memory of this process in bytes'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def applies(dformat, stage):
+    if stage == 'make_time':
+        return hasattr(FORMATS[dformat], 'make_time')
+    if stage == 'mod_status':
+        return hasattr(FORMATS[dformat], 'decode_status')
+    return True
+
+
+def measure(filename, dformat, stage, date_time=DATE_TIME):
+    '''
+    time one stage on a file, the stages before it are run first but not timed.
+    :return: (number of records, seconds, peak rss before the stage, peak rss after the stage)
+    '''
+    fmt = FORMATS[dformat]()
+    if stage in ('run', 'stream'):
+        reader = ReadBinFIle(filename, dformat, date_time=date_time)
+        before = peak_rss()
+        start = time.perf_counter()
+        if stage == 'run':
+            records = len(reader.run()[dformat])
+        else:
+            records = sum(len(chunk) for chunk in reader.iter_chunks())
+        return records, time.perf_counter() - start, before, peak_rss()
+    before = peak_rss()
+    start = time.perf_counter()
+    array = fmt.read_file(filename)
+    if stage != 'parse':
+        before = peak_rss()
+        start = time.perf_counter()
+        if stage == 'mod_status':
+            fmt.decode_status(array['status'])
+        else:
+            converted_array = fmt.convert_array(array)
+            if stage == 'make_time':
+                before = peak_rss()
+                start = time.perf_counter()
+                fmt.make_time(converted_array, date_time)
+    return len(array), time.perf_counter() - start, before, peak_rss()
+
+
+def worker(queue, filename, dformat, stage):
+    try:
+        queue.put(measure(filename, dformat, stage))
+    except Exception as error:
+        queue.put(error)
+
+
+def measure_in_process(filename, dformat, stage):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=worker, args=(queue, filename, dformat, stage))
+    process.start()
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except Empty:
+            # a process killed by the os (out of memory) never puts a result
+            if process.exitcode is not None:
+                raise ChildProcessError('measuring process died with exit code %d' % process.exitcode)
+    process.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def synthetic_file(workdir, dformat, size, variant, seed=0):
+    '''the synthetic file of a case, written the first time it is needed and kept in workdir'''
+    filename = os.path.join(workdir, '%s-%s-%d-%d.bin' % (dformat, variant, size, seed))
+    if not os.path.exists(filename):
+        synthetic.write_file(filename, dformat, size, variant, seed)
+    return filename
+
+
+def run(formats=None, sizes=('1M',), variants=('clean',), stages=STAGES, workdir='benchmark_data', repeat=1,
+        verbose=True):
+    '''
+    :return: dict with the environment under 'meta' and one entry pr. measurement under 'results'. a case that
+    fails (ie. a format whose optional dependency is missing) gets its error instead of the measurement.
+    '''
+    formats = formats or sorted(FORMATS)
+    if not os.path.isdir(workdir):
+        os.makedirs(workdir)
+    results = []
+    for dformat in formats:
+        for size in sizes:
+            size = parse_size(size)
+            for variant in variants:
+                filename = synthetic_file(workdir, dformat, size, variant)
+                for stage in stages:
+                    if not applies(dformat, stage):
+                        continue
+                    case = {'format': dformat, 'variant': variant, 'size': size, 'stage': stage}
+                    best = None
+                    try:
+                        for _ in range(repeat):
+                            measured = measure_in_process(filename, dformat, stage)
+                            if best is None or measured[1] < best[1]:
+                                best = measured
+                    except Exception as error:
+                        result = dict(case, records=None, seconds=None, records_per_s=None, rss_before=None,
+                                      peak_rss=None, error='%s: %s' % (type(error).__name__, error))
+                        results.append(result)
+                        if verbose:
+                            print('%-15s %-9s %10d %-10s failed, %s' % (dformat, variant, size, stage, result['error']))
+                        continue
+                    records, seconds, before, peak = best
+                    result = dict(case, records=records, seconds=seconds,
+                                  records_per_s=records / seconds if seconds > 0 else None,
+                                  rss_before=before, peak_rss=peak)
+                    results.append(result)
+                    if verbose:
+                        print('%-15s %-9s %10d %-10s %12.0f rec/s %8.1f MB' % (
+                            dformat, variant, size, stage, result['records_per_s'] or 0, peak / 2.0**20))
+    meta = {'date': datetime.datetime.now().isoformat(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count()}
+    return {'meta': meta, 'results': results}
+
+
+def compare(old, new, threshold=0.1):
+    '''
+    cases that got slower by more than threshold (0.1 is 10 %) from the old to the new run
+    :return: list of (case, old records/s, new records/s)
+    '''
+    def cases(report):
+        return dict(((r['format'], r['variant'], r['size'], r['stage']), r['records_per_s']) for r in report['results'])
+    old_cases, new_cases = cases(old), cases(new)
+    slower = []
+    for case, speed in sorted(new_cases.items()):
+        reference = old_cases.get(case)
+        if reference and speed is not None and speed < reference * (1 - threshold):
+            slower.append((case, reference, speed))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark the binary format readers on synthetic files')
+    parser.add_argument('--formats', nargs='*', default=None, choices=sorted(FORMATS))
+    parser.add_argument('--sizes', nargs='*', default=['1M', '100M'])
+    parser.add_argument('--variants', nargs='*', default=['clean'], choices=synthetic.VARIANTS)
+    parser.add_argument('--stages', nargs='*', default=STAGES, choices=STAGES)
+    parser.add_argument('--workdir', default='benchmark_data', help='where the synthetic files are kept')
+    parser.add_argument('--repeat', type=int, default=1, help='best of this many runs')
+    parser.add_argument('--out', default=None, help='json file to write the results to')
+    parser.add_argument('--compare', default=None, help='json file of an earlier run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args(argv)
+    report = run(args.formats, args.sizes, args.variants, args.stages, args.workdir, args.repeat)
+    if args.out:
+        with open(args.out, 'w') as fobj:
+            json.dump(report, fobj, indent=1)
+    if args.compare:
+        with open(args.compare) as fobj:
+            slower = compare(json.load(fobj), report, args.threshold)
+        for case, reference, speed in slower:
+            print('slower: %s %.0f -> %.0f rec/s' % (' '.join(str(part) for part in case), reference, speed))
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
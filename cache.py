@@ -0,0 +1,97 @@
+import hashlib
+import os
+import numpy as np
+from binary_formats import schema
+
+
+class ArrayCache(object):
+    '''
+    on disk cache of converted arrays, stored as uncompressed .npy files and opened again as read only memory maps.
+    an entry is keyed by the source file path, size and modification time, the format name, the converter version
+    and anything else that changes the result (date_time etc.), so a log that is appended to gets a new key.
+    a key is source-version-state, where version is the size and modification time of the file and the converter
+    version. entries are evicted least recently used first when the cache grows above max_bytes.
+    '''
+    def __init__(self, directory, max_bytes=8 * 2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, filename, dformat, *extra):
+        stat = os.stat(filename)
+        source = hashlib.sha1(os.path.abspath(filename).encode('utf8')).hexdigest()[:16]
+        version = repr((stat.st_size, stat.st_mtime_ns, schema.VERSION))
+        state = repr((dformat,) + extra)
+        return '-'.join([source, hashlib.sha1(version.encode('utf8')).hexdigest()[:16],
+                         hashlib.sha1(state.encode('utf8')).hexdigest()[:16]])
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def load(self, key):
+        '''
+        :return: the cached array as a read only memory map, None if there is no entry
+        '''
+        path = self.path(key)
+        try:
+            array = np.load(path, mmap_mode='r')
+        except (IOError, OSError, ValueError):
+            return None
+        os.utime(path, None)  # the modification time is the last use for the eviction
+        return array
+
+    def store(self, key, array):
+        self.remove_stale(key)
+        path = self.path(key)
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as fobj:
+            np.save(fobj, array)
+        os.replace(tmp, path)
+        self.evict()
+        return path
+
+    def remove_stale(self, key):
+        '''
+        entries of an older version of the same source file are outdated, entries of the same version with other
+        fields, windows or date_time are kept
+        '''
+        source, version = key.split('-')[:2]
+        for name in os.listdir(self.directory):
+            if name.startswith(source + '-') and not name.startswith(source + '-' + version + '-') \
+                    and name.endswith('.npy'):
+                self.remove(os.path.join(self.directory, name))
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self.remove(path)
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
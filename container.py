@@ -0,0 +1,194 @@
+import os
+import numpy as np
+from binary_formats.framing import FrameStats, drop_overlaps, extract
+
+# common header of the KM binary records, the length is of the whole record header included
+HEADER = [('id', 'S4'), ('length', '<u2'), ('version', '<u2')]
+# one row pr. record found, in file order
+TABLE_DTYPE = [('offset', '<i8'), ('id', 'S4'), ('length', '<u2'), ('version', '<u2')]
+
+
+def find_prefix(data, prefix, block_size=2**24):
+    '''
+    positions of prefix in a uint8 array, block by block. only the positions of the first byte are compared
+    further, so the cost is one pass over the data and a few gathers.
+    '''
+    size = np.dtype(HEADER).itemsize
+    chunks = []
+    for start in range(0, len(data), block_size):
+        block = data[start:start + block_size + size - 1]
+        count = min(block_size, len(block) - size + 1)
+        if count <= 0:
+            break
+        index = np.flatnonzero(block[:count] == prefix[0])
+        for offset, value in enumerate(bytearray(prefix[1:]), 1):
+            index = index[block[index + offset] == value]
+        chunks.append(index + start)
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.intp)
+
+
+def chain(positions, lengths, total):
+    '''
+    true for the candidates that are records. a record is followed by an other candidate or the end of the data and
+    preceded by a candidate that ends where it starts, a prefix found by chance inside a record seldom is either.
+    candidates linked both ways are kept first, the ones linked one way (next to a damaged stretch) are kept where
+    they do not overlap them.
+    '''
+    ends = positions + lengths
+    plausible = (lengths >= np.dtype(HEADER).itemsize) & (ends <= total)
+    if not len(positions):
+        return plausible
+    # the candidate that starts where each candidate ends, one search gives the links both ways
+    target = np.minimum(np.searchsorted(positions, ends), len(positions) - 1)
+    hit = plausible & (positions[target] == ends)
+    hit[hit] = plausible[target[hit]]
+    forward = plausible & (hit | (ends == total))
+    backward = positions == 0
+    backward[target[hit]] = True
+    backward &= plausible
+    keep = forward & backward
+    keep[keep] = drop_overlaps(positions[keep], lengths[keep])
+    weak = np.flatnonzero((forward | backward) & ~keep)
+    if len(weak):
+        strong = np.flatnonzero(keep)
+        # the last record kept that starts before the candidate ends must end before the candidate starts
+        before = np.searchsorted(positions[strong], ends[weak]) - 1
+        free = before < 0
+        if len(strong):
+            free |= ends[strong[np.maximum(before, 0)]] <= positions[weak]
+        keep[weak[free]] = True
+        keep[keep] = drop_overlaps(positions[keep], lengths[keep])
+    return keep
+
+
+def scan(data, prefix=b'#KM', block_size=2**24):
+    '''
+    first pass of the container parser, the offset, id, length and version of every record in the data
+    :return: TABLE_DTYPE array in file order and the FrameStats of the scan
+    '''
+    data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.view(np.uint8)
+    stats = FrameStats()
+    stats.total_bytes = len(data)
+    positions = find_prefix(data, prefix, block_size)
+    headers = extract(data, positions, HEADER)
+    lengths = headers['length'].astype(np.int64)
+    keep = chain(positions, lengths, len(data))
+    stats.rejected = int(len(keep) - np.count_nonzero(keep))
+    table = np.empty(np.count_nonzero(keep), dtype=TABLE_DTYPE)
+    table['offset'] = positions[keep]
+    for name in ('id', 'length', 'version'):
+        table[name] = headers[name][keep]
+    stats.records = len(table)
+    if len(table):
+        ends = table['offset'] + table['length']
+        gaps = table['offset'] - np.concatenate(([0], ends[:-1]))
+        stats.skipped_records = int(np.count_nonzero(gaps)) + int(ends[-1] < len(data))
+        stats.skipped_bytes = int(gaps.sum()) + len(data) - int(ends[-1])
+        stats.end = int(ends[-1])
+    else:
+        stats.skipped_bytes = len(data)
+    return table, stats
+
+
+def offset_tables(table):
+    '''
+    second pass, the rows of the table grouped by record type and version
+    :return: dict of (id, version): rows of that type in file order
+    '''
+    if not len(table):
+        return {}
+    key = table['id'].view('<u4').astype(np.uint64) << 16 | table['version']
+    if np.all(key == key[0]):
+        # the common case of a log with one record type
+        return {(bytes(table['id'][0]), int(table['version'][0])): table}
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    first = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+    tables = {}
+    for start, end in zip(first, np.append(first[1:], len(key))):
+        rows = table[order[start:end]]
+        tables[(bytes(rows['id'][0]), int(rows['version'][0]))] = rows
+    return tables
+
+
+def layout(dtype, size):
+    '''the fields of dtype padded to an itemsize of size'''
+    dtype = np.dtype(dtype)
+    return np.dtype({'names': dtype.names, 'formats': [dtype.fields[name][0] for name in dtype.names],
+                     'offsets': [dtype.fields[name][1] for name in dtype.names], 'itemsize': size})
+
+
+class ContainerParser(object):
+    '''
+    parser for logs where records of different types, versions and lengths are interleaved, each record starting
+    with an id (prefix and type), its length and a version. the headers are scanned first and then every record
+    type is copied out in bulk with its own dtype.
+    :param types: dict of id: dtype of the known records. records at least as long as the dtype are decoded with it,
+    the fields a newer version appends are left out. other records are decoded with only the header fields and
+    their own length, record_bytes gives the body.
+    '''
+    def __init__(self, types=None, prefix=b'#KM', block_size=2**24):
+        self.types = dict(types or {})
+        self.prefix = prefix
+        self.block_size = block_size
+        self.stats = FrameStats()
+        self.tables = {}
+
+    def parse(self, data):
+        '''
+        :return: dict of (id, version): record array
+        '''
+        data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.view(np.uint8)
+        table, self.stats = scan(data, self.prefix, self.block_size)
+        self.tables = offset_tables(table)
+        return dict((key, self.decode(data, rows)) for key, rows in self.tables.items())
+
+    def parse_file(self, filename):
+        if os.path.getsize(filename) == 0:
+            return self.parse(np.zeros(0, dtype=np.uint8))
+        return self.parse(np.memmap(filename, dtype=np.uint8, mode='r'))
+
+    def record_dtype(self, record_id, size):
+        dtype = self.types.get(record_id)
+        if dtype is not None and np.dtype(dtype).itemsize <= size:
+            return np.dtype(dtype)
+        return layout(HEADER, size)
+
+    def decode(self, data, rows):
+        # a version has one length, the shortest is used if the lengths differ
+        size = int(rows['length'].min())
+        return extract(data, rows['offset'], self.record_dtype(bytes(rows['id'][0]), size))
+
+
+class RecordMap(object):
+    '''
+    records of one dtype at the offsets of a scanned table, read from the memory map of the log when they are
+    indexed. stands in for the memory map of a fixed record grid: len, slices and bool masks give record arrays,
+    np.asanyarray reads all the records.
+    '''
+    def __init__(self, data, offsets, dtype):
+        self.data = data
+        self.offsets = offsets
+        self.dtype = np.dtype(dtype)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def shape(self):
+        return (len(self.offsets),)
+
+    @property
+    def nbytes(self):
+        return len(self.offsets) * self.dtype.itemsize
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self[:][key]
+        if isinstance(key, (int, np.integer)):
+            return extract(self.data, np.atleast_1d(self.offsets[key]), self.dtype)[0]
+        return extract(self.data, self.offsets[key], self.dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[:]
+        return array if dtype is None else array.astype(dtype)
@@ -0,0 +1,265 @@
+import json
+import os
+import numpy as np
+from binary_formats.reader import ReadBinFIle
+from binary_formats.schema import VERSION
+
+MANIFEST = 'manifest.json'
+
+
+class Column(object):
+    '''
+    how one converted column is stored. the stored values decode as stored * scale + offset in dtype, scale None
+    means the values are stored as they are (only cast to the stored type).
+    '''
+    def __init__(self, name, dtype, stored, scale=None, offset=None):
+        self.name = name
+        self.dtype = np.dtype(dtype).newbyteorder('=')
+        self.stored = np.dtype(stored).newbyteorder('=')
+        self.scale = scale
+        self.offset = offset
+
+    def encode(self, values):
+        if self.scale is None:
+            return values.astype(self.stored)
+        if self.offset is not None:
+            values = values - self.offset
+        info = np.iinfo(self.stored)
+        return np.clip(np.round(values / self.scale), info.min, info.max).astype(self.stored)
+
+    def decode(self, stored):
+        if self.scale is None:
+            return stored.astype(self.dtype)
+        values = stored * self.scale
+        if self.offset is not None:
+            values = values + self.offset
+        return values.astype(self.dtype)
+
+    def as_dict(self):
+        return {'name': self.name, 'dtype': self.dtype.str, 'stored': self.stored.str, 'scale': self.scale,
+                'offset': self.offset}
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(entry['name'], entry['dtype'], entry['stored'], entry['scale'], entry['offset'])
+
+
+def column_plan(fmt, dtype, downcast=True, quantize=False):
+    '''
+    storage of every column of a converted dtype, derived from the schema of the format.
+    :param downcast: True to store float64 columns as float32 where the raw telegram has no more resolution than
+    that (16 bit integers, float32) and decoded status columns as uint8, False to keep the types, or a dict of
+    column name: dtype.
+    :param quantize: True to store the columns that are a scaled raw integer as that integer again, which is
+    lossless and as compact as the telegram, False for none, or a dict of column name: (dtype, scale) or
+    (dtype, scale, offset) for fixed point storage of any column.
+    '''
+    fields = dict((field.name, field) for field in (fmt.fields or []))
+    raw = np.dtype(fmt.raw) if fmt.raw is not None else None
+    columns = []
+    for name in dtype.names:
+        kind = dtype[name].newbyteorder('=')
+        field = fields.get(name)
+        source = raw.fields[field.src][0] if field is not None and field.sources else None
+        if isinstance(quantize, dict):
+            if name in quantize:
+                columns.append(Column(name, kind, *quantize[name]))
+                continue
+        elif quantize and field is not None and scaled_integer(field, source):
+            columns.append(Column(name, kind, source, field.scale, field.offset))
+            continue
+        if isinstance(downcast, dict):
+            stored = downcast.get(name, kind)
+        elif downcast and field is not None:
+            stored = downcast_type(field, kind, source)
+        else:
+            stored = kind
+        columns.append(Column(name, kind, stored))
+    return columns
+
+
+def scaled_integer(field, source):
+    '''true when the column is only a raw integer times a scale (and plus an offset)'''
+    return source is not None and source.kind in 'iu' and field.scale is not None and field.unit is None and \
+        field.func is None and field.frac is None and field.lut is None and field.bits is None
+
+
+def downcast_type(field, kind, source):
+    if field.bits is not None:
+        return np.dtype('u1')  # 0 ok, 1 reduced and 2 invalid
+    if kind == np.float64 and field.frac is None and source is not None:
+        if (source.kind in 'iu' and source.itemsize <= 2) or source == np.float32:
+            return np.dtype('f4')
+    return kind
+
+
+class NpyWriter(object):
+    '''
+    numpy only store, a directory with one sub directory pr. column holding one .npy file pr. chunk and a json
+    manifest. the manifest is written last, a directory without one is an export that did not finish.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.chunks = []
+
+    def open(self, columns, meta):
+        self.columns = columns
+        self.meta = meta
+        for column in columns:
+            directory = os.path.join(self.path, column.name)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        manifest = os.path.join(self.path, MANIFEST)
+        if os.path.exists(manifest):
+            os.remove(manifest)
+
+    def write(self, encoded):
+        index = len(self.chunks)
+        for column in self.columns:
+            np.save(os.path.join(self.path, column.name, '%06d.npy' % index), encoded[column.name])
+        self.chunks.append(len(encoded[self.columns[0].name]) if self.columns else 0)
+
+    def close(self):
+        manifest = dict(self.meta, rows=sum(self.chunks), chunks=self.chunks,
+                        columns=[column.as_dict() for column in self.columns])
+        tmp = os.path.join(self.path, MANIFEST + '.tmp')
+        with open(tmp, 'w') as fobj:
+            json.dump(manifest, fobj, indent=1)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+
+
+class Hdf5Writer(object):
+    '''one resizable, chunked and compressed dataset pr. column, the manifest is kept in the file attributes'''
+    def __init__(self, path, compression='gzip'):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError('the hdf5 export needs h5py')
+        self.path = path
+        self.h5py = h5py
+        self.compression = compression
+        self.rows = 0
+
+    def open(self, columns, meta):
+        self.columns = columns
+        self.meta = meta
+        self.file = self.h5py.File(self.path, 'w')
+        for column in columns:
+            dataset = self.file.create_dataset(column.name, shape=(0,), maxshape=(None,), dtype=column.stored,
+                                               chunks=True, compression=self.compression)
+            dataset.attrs['column'] = json.dumps(column.as_dict())
+
+    def write(self, encoded):
+        count = len(encoded[self.columns[0].name]) if self.columns else 0
+        for column in self.columns:
+            dataset = self.file[column.name]
+            dataset.resize((self.rows + count,))
+            dataset[self.rows:] = encoded[column.name]
+        self.rows += count
+
+    def close(self):
+        self.file.attrs['manifest'] = json.dumps(dict(self.meta, rows=self.rows,
+                                                      columns=[column.as_dict() for column in self.columns]))
+        self.file.close()
+
+
+class ParquetWriter(object):
+    '''one row group pr. chunk, the manifest is kept in the schema metadata'''
+    def __init__(self, path, compression='zstd'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('the parquet export needs pyarrow')
+        self.path = path
+        self.pyarrow = pyarrow
+        self.compression = compression
+        self.rows = 0
+
+    def open(self, columns, meta):
+        pyarrow = self.pyarrow
+        self.columns = columns
+        manifest = dict(meta, columns=[column.as_dict() for column in columns])
+        self.schema = pyarrow.schema([pyarrow.field(column.name, pyarrow.from_numpy_dtype(column.stored))
+                                      for column in columns], metadata={'binary_formats': json.dumps(manifest)})
+        self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema, compression=self.compression)
+
+    def write(self, encoded):
+        arrays = [self.pyarrow.array(encoded[column.name]) for column in self.columns]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {'npy': NpyWriter, 'hdf5': Hdf5Writer, 'parquet': ParquetWriter}
+
+
+def export(filename, out, dformat='Auto', backend='npy', downcast=True, quantize=False, chunk_size=2**18,
+           date_time=None, fields=None, **reader_args):
+    '''
+    convert a file chunk by chunk into a columnar store, memory use is bounded by the chunk size.
+    :param out: directory for 'npy', file name for 'hdf5' and 'parquet'
+    :param downcast: see column_plan
+    :param quantize: see column_plan
+    :param reader_args: more arguments for ReadBinFIle, ie. start, end, resync and zero_copy
+    :return: the list of Columns that were written
+    '''
+    if backend not in WRITERS:
+        raise ValueError('backend must be one of %s' % ', '.join(sorted(WRITERS)))
+    reader = ReadBinFIle(filename, dformat, date_time=date_time, chunk_size=chunk_size, fields=fields,
+                         **reader_args)
+    writer = WRITERS[backend](out)
+    columns = None
+    for chunk in reader.iter_chunks():
+        if columns is None:
+            columns = open_writer(writer, reader, chunk_dtype(chunk), downcast, quantize)
+        writer.write(dict((column.name, column.encode(chunk[column.name])) for column in columns))
+    if columns is None:
+        # no records, the store gets the columns all the same
+        empty = reader.convert(np.zeros(0, dtype=reader.fmt.dtype))
+        columns = open_writer(writer, reader, chunk_dtype(empty), downcast, quantize)
+    writer.close()
+    return columns
+
+
+def chunk_dtype(chunk):
+    '''dtype of a converted chunk, a record array or the dict of columns of zero_copy'''
+    if isinstance(chunk, dict):
+        return np.dtype([(name, column.dtype) for name, column in chunk.items()])
+    return chunk.dtype
+
+
+def open_writer(writer, reader, dtype, downcast, quantize):
+    columns = column_plan(reader.fmt, dtype, downcast, quantize)
+    meta = {'format': reader.dformat, 'source': os.path.abspath(reader.filename), 'schema_version': VERSION}
+    writer.open(columns, meta)
+    return columns
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as fobj:
+        return json.load(fobj)
+
+
+def read_export(path, fields=None, start=0, stop=None):
+    '''
+    read an npy export back as a converted record array, only the chunks that overlap rows start to stop are read
+    :param fields: columns to read, all if None
+    '''
+    manifest = read_manifest(path)
+    columns = [Column.from_dict(entry) for entry in manifest['columns']]
+    if fields is not None:
+        columns = dict((column.name, column) for column in columns)
+        columns = [columns[name] for name in fields]
+    stop = manifest['rows'] if stop is None else min(stop, manifest['rows'])
+    out = np.empty(max(stop - start, 0), dtype=[(column.name, column.dtype) for column in columns])
+    first = 0
+    for index, count in enumerate(manifest['chunks']):
+        low, high = max(start, first), min(stop, first + count)
+        if low < high:
+            for column in columns:
+                stored = np.load(os.path.join(path, column.name, '%06d.npy' % index), mmap_mode='r')
+                out[column.name][low - start:high - start] = column.decode(stored[low - first:high - first])
+        first += count
+    return out
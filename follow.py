@@ -0,0 +1,83 @@
+import os
+import numpy as np
+from binary_formats.formats import FORMATS
+from binary_formats.framing import FrameStats, block_end
+from binary_formats.reader import DetectFormat
+
+
+class FileFollower(object):
+    '''
+    follows a log file that the logger is still appending to. the byte offset read so far and any partial record at
+    the end are remembered, so each poll only reads and converts the new bytes.
+    '''
+    def __init__(self, filename, dformat='Auto', date_time=None, resync=False):
+        self.filename = filename
+        self.dformat = dformat
+        self.date_time = date_time
+        self.resync = resync
+        self.fmt = None
+        self.offset = 0
+        self.partial = b''
+        self.state = None
+        self.frame_stats = FrameStats()
+        self.identity = None  # device and inode of the file that is followed
+
+    def set_format(self):
+        '''
+        :return: False while the file is still too short to detect the format
+        '''
+        if self.fmt is not None:
+            return True
+        if self.dformat == 'Auto':
+            try:
+                self.dformat = DetectFormat(self.filename).run()
+            except TypeError:
+                return False
+        self.fmt = FORMATS[self.dformat]()
+        return True
+
+    def reset(self):
+        '''start over from the beginning of the file, used when the file is truncated or replaced'''
+        self.offset = 0
+        self.partial = b''
+        self.state = None
+        self.frame_stats = FrameStats()
+
+    def read_new(self):
+        status = os.stat(self.filename)
+        size = status.st_size
+        # a rotated or replaced log is an other file at the same path, it can be longer than the one before
+        identity = (status.st_dev, status.st_ino)
+        if size < self.offset or (self.identity is not None and identity != self.identity):
+            self.reset()
+        self.identity = identity
+        if size == self.offset:
+            return b''
+        with open(self.filename, 'rb') as fobj:
+            fobj.seek(self.offset)
+            data = fobj.read(size - self.offset)
+        self.offset += len(data)
+        return data
+
+    def poll(self):
+        '''
+        :return: converted array of the records completed since the last poll, None until the format is known
+        '''
+        if not self.set_format():
+            return None
+        new = self.read_new()
+        data = self.partial + new
+        itemsize = np.dtype(self.fmt.dtype).itemsize
+        if self.resync or self.fmt.container:
+            raw_array, stats = self.fmt.frame(data)
+            end = block_end(self.fmt, stats, len(data))
+            self.frame_stats.add(stats)
+        else:
+            count = len(data) // itemsize
+            raw_array = np.frombuffer(data, dtype=self.fmt.dtype, count=count)
+            end = count * itemsize
+        self.partial = data[end:]
+        converted_array = self.fmt.convert_array(raw_array)
+        if self.date_time is not None and hasattr(self.fmt, 'make_time'):
+            self.state = self.fmt.make_time(converted_array, self.date_time, self.state)
+        return converted_array
@@ -1,6 +1,37 @@
 import numpy as np
 import datetime
-from stx_functions.functions import conv_head
+import os
+from binary_formats.framing import FrameStats, Framer, blkcrc, block_end, extract, record_bytes
+from binary_formats.schema import Field, Converter, status_column
+
+FORMATS = {}  # format name: format class, filled by the register decorator
+
+
+def conv_head(heading):
+    '''
+    heading conversion from stx_functions, which is only imported when a heading is converted so the other formats
+    can be used without it
+    '''
+    from stx_functions.functions import conv_head as stx_conv_head
+    return stx_conv_head(heading)
+
+
+def register(name):
+    '''
+    class decorator that adds a format to FORMATS, which is where ReadBinFIle and DetectFormat find them.
+    '''
+    def decorator(cls):
+        cls.name = name
+        FORMATS[name] = cls
+        return cls
+    return decorator
+
+
+# Seapath scale factors
+SEAPATH_POS = 90.0 / 2 ** 30
+SEAPATH_ATTI = 90.0 / 2 ** 14
+SEAPATH_HEADING = 360.0 / 2 ** 16
+SEAPATH_CM = 0.01
 
 
 class BinaryAbc(object):
@@ -8,13 +39,33 @@ class BinaryAbc(object):
     the binary abstract base class is implemented to ensure that all binary format classes have the
      correct minimum functions needed by the top read_file class and serial / udp read classes.
     '''
+    # bytes every telegram has at sync_offset, used by the framing.Framer to find telegrams after lost bytes.
+    # formats without a documented sync have None and are framed on the fixed record grid
+    sync = None
+    sync_offset = 0
+    # records of other types and lengths can be interleaved in the log, the records are only found by their headers
+    # (frame) and never on the fixed record grid
+    container = False
+    # schema of the format, raw is the dtype of the telegram and fields the columns of the converted array
+    raw = None
+    fields = None
+    # converted column with a time stamp that is computed from the raw record alone, used to bisect time windows.
+    # None for formats that only get a time from make_time
+    time_field = None
+    # records carry a checksum or are linked by their lengths, the detector trusts a valid record as it is
+    checked = False
 
     def __init__(self):
         self.dtype_erect()
         self.struct_erect()
 
     def dtype_erect(self):
-        pass
+        self.projections = {}
+        if self.raw is not None:
+            self.dtype = self.raw
+        if self.fields is not None:
+            self.converter = Converter(self.raw, self.fields)
+            self.new_dtype = self.converter.dtype.descr
 
     def struct_erect(self):
         pass
@@ -23,21 +74,165 @@ class BinaryAbc(object):
         array = np.fromfile(filename, dtype=self.dtype)
         return array
 
+    def memmap_file(self, filename):
+        '''
+        map the file read only instead of reading it, only the records that are touched are paged in. a trailing
+        partial record is ignored the same way np.fromfile does.
+        '''
+        dtype = np.dtype(self.dtype)
+        count = os.path.getsize(filename) // dtype.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(filename, dtype=dtype, mode='r', shape=(count,))
+
+    def frame(self, data, check=True):
+        '''
+        the records in a block of raw bytes found by their sync, see framing.Framer
+        :param check: validate every record with the checksum, the slow part of framing a clean log
+        :return: record array and the FrameStats of the block
+        '''
+        return Framer(self, check=check).frame(data)
+
+    def frame_file(self, filename, check=True):
+        if os.path.getsize(filename) == 0:
+            return self.frame(np.zeros(0, dtype=np.uint8), check)
+        return self.frame(np.memmap(filename, dtype=np.uint8, mode='r'), check)
+
     def read_line(self, data, convert=False):
-        array = np.fromstring(data, dtype=self.dtype)
-        # print(org_array, len(org_array))
+        array = np.frombuffer(data, dtype=self.dtype)
         if convert:
-            array = self.convert_array(array)
-        return array
+            return self.convert_array(array)
+        return array.copy()
 
-    def convert_array(self, array):
-        return array
+    def convert_array(self, array, fields=None):
+        '''
+        :param fields: names of the columns to convert, all columns if None
+        '''
+        if self.fields is None:
+            return array
+        if fields is not None:
+            return self.projection(fields)(array)
+        return self.converter(array)
+
+    def convert_columns(self, array, fields=None, native=True):
+        '''
+        zero copy conversion, dict of columns where the columns that need no transform are views of the raw array.
+        see schema.Converter.columns.
+        '''
+        if self.fields is None:
+            return dict((name, array[name]) for name in (fields or array.dtype.names))
+        converter = self.converter if fields is None else self.projection(fields)
+        return converter.columns(array, native)
+
+    def projection(self, names):
+        '''
+        converter for only the columns in names, in that order. the converters are compiled once and kept.
+        '''
+        names = tuple(names)
+        if names not in self.projections:
+            fields = dict((field.name, field) for field in self.fields)
+            missing = [name for name in names if name not in fields]
+            if missing:
+                raise ValueError('%s has no fields %s' % (self.name, ', '.join(missing)))
+            self.projections[names] = Converter(self.raw, [fields[name] for name in names])
+        return self.projections[names]
+
+    def record_time(self, array):
+        '''
+        time stamps of raw records, only the time column is converted
+        '''
+        return self.projection([self.time_field])(array)[self.time_field]
+
+    def time_window(self, array, start=None, end=None):
+        '''
+        first and last + 1 index of the records with start <= time <= end. the raw records are bisected one at the
+        time, so only about 2 * log2(n) records of a memory mapped file are read. time stamps are taken as increasing.
+        '''
+        def bisect(value, right):
+            low, high = 0, len(array)
+            while low < high:
+                mid = (low + high) // 2
+                time = self.record_time(array[mid:mid + 1])[0]
+                if time < value or (right and time == value):
+                    low = mid + 1
+                else:
+                    high = mid
+            return low
+
+        first = 0 if start is None else bisect(start, False)
+        last = len(array) if end is None else bisect(end, True)
+        return first, max(first, last)
+
+    def time_slice(self, count, date_time, start=None, end=None):
+        '''
+        for formats that only get a time from make_time: first and last + 1 index of the count records that make_time
+        gives start <= time <= end, and the state make_time goes on with from the first. None when the times can not
+        be known without converting the records.
+        '''
+        return None
+
+    def sync_pattern(self):
+        '''(position in the telegram, byte value) of every sync byte, empty for formats without a sync'''
+        if not self.sync:
+            return []
+        return [(self.sync_offset + i, value) for i, value in enumerate(bytearray(self.sync))]
+
+    def validate(self, array):
+        '''
+        check raw records against the checksum or whatever else the format offers, returns a bool array that is
+        true for the records that are good.
+        '''
+        return np.ones(len(array), dtype=bool)
+
+    def time_steps(self, array):
+        '''seconds between the time stamps of raw records, None for formats without a time in the record'''
+        if self.time_field is None:
+            return None
+        return np.diff(self.record_time(array))
+
+    def evidence(self, array):
+        '''
+        share of the valid raw records, 0 to 1, that back a detection of the format. a record with a checksum is
+        evidence enough, without one a single record is easily matched by chance. then only records with data
+        besides the sync, finite floats and a time stamp a steady step after the one before count.
+        '''
+        if not len(array):
+            return 0.0
+        if self.checked:
+            return 1.0
+        keep = np.ones(array.dtype.itemsize, dtype=bool)
+        keep[[position for position, value in self.sync_pattern()]] = False
+        good = record_bytes(array)[:, keep].any(axis=1)
+        for name in array.dtype.names:
+            if array.dtype[name].kind == 'f':
+                good &= np.isfinite(array[name])
+        steps = self.time_steps(array)
+        if steps is not None and len(steps):
+            step = np.median(steps)
+            if not step > 0:
+                return 0.0
+            good[1:] &= (steps > step / 2) & (steps < step * 2)
+        return np.count_nonzero(good) / float(len(array))
 
     def calcEpoch(self, Year, Month, Day, HH, mm, ss):
         dt = datetime.datetime(1970, 1, 1)
         return (datetime.datetime(Year, Month, Day, HH, mm, ss) - dt).total_seconds()
 
+    def epoch(self, date_time):
+        '''
+        posix time of date_time given as a (year, month, day, hour, minute, second, ...) tuple, a datetime or an
+        epoch float. datetimes without time zone are taken as utc.
+        '''
+        if isinstance(date_time, datetime.datetime):
+            if date_time.tzinfo is not None:
+                date_time = date_time.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            return (date_time - datetime.datetime(1970, 1, 1)).total_seconds()
+        if isinstance(date_time, (int, float, np.number)):
+            return float(date_time)
+        return self.calcEpoch(*date_time[:6])
+
 
+@register('EM3000')
 class EM3000(BinaryAbc):
     '''
     EM3000 binary format is an aincient format made by Simarad Horten for early subsea equipment,
@@ -46,355 +241,498 @@ class EM3000(BinaryAbc):
     year, month, day, hour, minute, second and interval of datagrams. date time is specified when first datagram is
     sampled.
     '''
-    def __init__(self):
-        super(EM3000, self).__init__()
-        self.dtype = [('status', '<u1'), ('header', '<u1'), ('Roll', '<i2'),
-                      ('Pitch', '<i2'), ('Heave', '<i2'), ('Heading', '<u2')]
-
-        self.new_dtype = [('status', '<u1'), ('header', '<u1'), ('Roll', '<f4'),
-                          ('Pitch', '<f4'), ('Heave', '<f4'), ('Heading', '<f4'), ('utc_time', '<f8')]
-
-    def convert_array(self, array):
-        new_array = np.zeros((len(array)), dtype=self.new_dtype)
-        names = ['Roll', 'Pitch', 'Heading', 'Heave']
-        for item in self.new_dtype:
-            name = item[0]
-            if name in names:
-                new_array[name] = array[name] * 0.01
-            else:
-                try:
-                    new_array[name] = array[name]
-                except ValueError:
-                    continue
-        for old, new in {144: 0, 145: 1, 160: 2}.items():
-            new_array['status'][np.where(new_array['status'] == old)] = new
-        return new_array
+    # the header byte follows the status byte, which changes with the sensor status and is no sync
+    sync = b'\x90'
+    sync_offset = 1
+    raw = [('status', '<u1'), ('header', '<u1'), ('Roll', '<i2'),
+           ('Pitch', '<i2'), ('Heave', '<i2'), ('Heading', '<u2')]
 
-    def make_time(self, array, date_time):
+    fields = [Field('status', '<u1', lut={144: 0, 145: 1, 160: 2}), Field('header', '<u1'),
+              Field('Roll', '<f4', scale=0.01), Field('Pitch', '<f4', scale=0.01), Field('Heave', '<f4', scale=0.01),
+              Field('Heading', '<f4', scale=0.01), Field('utc_time', '<f8', value=0)]
+
+    def validate(self, array):
+        return np.isin(array['status'], [144, 145, 160]) & (array['header'] == 0x90)
+
+    def make_time(self, array, date_time, state=None, interval=None):
         '''
         Some binary formats do not have a time stamp, or lake som time information to give a full
         posix time stamp, make sure that your format parser makes a full posix time before returning the parsed result.
-        :return:
-        '''
-        year = date_time[0]
-        month = date_time[1]
-        day = date_time[2]
-        hour = date_time[3]
-        minute = date_time[4]
-        second = date_time[5]
-        interval = date_time[6]
-        init_time = self.calcEpoch(year, month, day, hour, minute, second)
-        for x in range(len(array)):
-            array['utc_time'][x] = init_time
-            init_time += interval
-        return
-
-
-class SeapathBin11(object):
-    def __init__(self):
-        self.sp_dtype = [('Header1', '>u1'), ('utc_time', '>i4'),  ('utc_fraction', '>u1'),
-                         ('latitude', '>i4'), ('longitude', '>i4'), ('height', '>i4'), ('heave', '>i2'),
-                         ('north_vel', '>i2'), ('east_vel', '>i2'), ('down_vel', '>i2'), ('roll', '>i2'), ('pitch','>i2'),
-                         ('heading', '>u2'), ('roll_rate', '>i2'), ('pitch_rate', '>i2'), ('yaw_rate', '>i2'),
-                         ('status', '>u2'), ('checksum', '>u2')]
-
-        self.new_dtype = [('Header1', '>u1'), ('utc_time', '>f8'),
-                         ('latitude', '>f8'), ('longitude', '>f8'), ('height', '>f8'), ('heave', '>f8'),
-                         ('north_vel', '>f8'), ('east_vel', '>f8'), ('down_vel', '>f8'), ('roll', '>f4'), ('pitch','>f4'),
-                         ('heading', '>f4'), ('roll_rate', '>f4'), ('pitch_rate', '>f4'), ('yaw_rate', '>f4'),
-                         ('status', '>u2'), ('checksum', '>u2')]
+        :param date_time: the 7 tuple described above, (start, interval) or start alone, where start is a datetime
+        or epoch float. start alone needs interval.
+        :param state: dict returned by the previous call when the file is processed in chunks.
+        :param interval: datagram interval in seconds, overrides the interval in date_time.
+        :return: state to pass on with the next chunk
+        '''
+        if isinstance(date_time, (datetime.datetime, int, float, np.number)):
+            if interval is None:
+                raise ValueError('interval is needed when date_time is a datetime or an epoch float')
+            start = date_time
+        else:
+            start = date_time[0] if len(date_time) == 2 else date_time
+            if interval is None:
+                interval = date_time[-1]
+        if state:
+            init_time = state['init_time']
+        else:
+            init_time = self.epoch(start)
+        # the length of a column, array can also be a dict of columns
+        count = len(array['utc_time'])
+        if count == 0:
+            return {'init_time': init_time}
+        # accumulate the interval the same way as adding it in a loop, so the result is identical to the bit
+        steps = np.full(count, interval, dtype=np.float64)
+        steps[0] = init_time
+        np.cumsum(steps, out=steps)
+        array['utc_time'] = steps
+        return {'init_time': float(steps[-1]) + interval}
+
+    def time_slice(self, count, date_time, start=None, end=None, block_size=2**20):
+        '''
+        the times only depend on the record number, they are summed by make_time block by block until the end of the
+        window without reading a record. None without an interval.
+        '''
+        if date_time is None:
+            return None
+        try:
+            self.make_time({'utc_time': np.empty(0)}, date_time)
+        except ValueError:
+            return None
+        state = None
+        first = 0 if start is None else None
+        first_state = None
+        position = 0
+        while position < count:
+            times = {'utc_time': np.empty(min(block_size, count - position))}
+            state = self.make_time(times, date_time, state)
+            time = times['utc_time']
+            if first is None:
+                index = int(np.searchsorted(time, start, 'left'))
+                if index < len(time):
+                    first = position + index
+                    first_state = {'init_time': float(time[index])}
+            if first is not None and end is not None:
+                index = int(np.searchsorted(time, end, 'right'))
+                if index < len(time):
+                    return first, max(first, position + index), first_state
+            position += len(time)
+        if first is None:
+            return count, count, None
+        return first, count, first_state
+
+
+def seapath_fields(names):
+    '''
+    converted columns shared by the Seapath binary formats, in the order given by names.
+    '''
+    fields = {'Header1': Field('Header1', '>u1'), 'Header2': Field('Header2', '>u1'),
+              'utc_time': Field('utc_time', '>f8', frac='utc_fraction', frac_scale=0.0001),
+              'latitude': Field('latitude', '>f8', scale=SEAPATH_POS),
+              'longitude': Field('longitude', '>f8', scale=SEAPATH_POS),
+              'height': Field('height', '>f8', scale=SEAPATH_CM), 'heave': Field('heave', '>f8', scale=-SEAPATH_CM),
+              'north_vel': Field('north_vel', '>f8', scale=SEAPATH_CM),
+              'east_vel': Field('east_vel', '>f8', scale=SEAPATH_CM),
+              'down_vel': Field('down_vel', '>f8', scale=SEAPATH_CM),
+              'roll': Field('roll', '>f4', scale=SEAPATH_ATTI), 'pitch': Field('pitch', '>f4', scale=SEAPATH_ATTI),
+              'heading': Field('heading', '>f4', scale=SEAPATH_HEADING),
+              'roll_rate': Field('roll_rate', '>f4', scale=SEAPATH_ATTI),
+              'pitch_rate': Field('pitch_rate', '>f4', scale=SEAPATH_ATTI),
+              'yaw_rate': Field('yaw_rate', '>f4', scale=SEAPATH_ATTI),
+              'delayed_heave_time': Field('delayed_heave_time', '>f8', frac='delayed_heave_frac', frac_scale=0.0001),
+              'delayed_heave': Field('delayed_heave', '>f4', scale=-SEAPATH_CM),
+              'status': Field('status', '>u2'), 'checksum': Field('checksum', '>u2')}
+    return [fields[name] for name in names]
+
+
+@register('Seapath_bin11')
+class SeapathBin11(BinaryAbc):
+    time_field = 'utc_time'
+    sync = b'\xaa'
+    checked = True
+    raw = [('Header1', '>u1'), ('utc_time', '>i4'),  ('utc_fraction', '>u1'),
+           ('latitude', '>i4'), ('longitude', '>i4'), ('height', '>i4'), ('heave', '>i2'),
+           ('north_vel', '>i2'), ('east_vel', '>i2'), ('down_vel', '>i2'), ('roll', '>i2'), ('pitch', '>i2'),
+           ('heading', '>u2'), ('roll_rate', '>i2'), ('pitch_rate', '>i2'), ('yaw_rate', '>i2'),
+           ('status', '>u2'), ('checksum', '>u2')]
+
+    fields = seapath_fields(['Header1', 'utc_time', 'latitude', 'longitude', 'height', 'heave', 'north_vel',
+                             'east_vel', 'down_vel', 'roll', 'pitch', 'heading', 'roll_rate', 'pitch_rate',
+                             'yaw_rate', 'status', 'checksum'])
 
-    def read_file(self, filename):
-        array = np.fromfile(filename, dtype=self.sp_dtype)
-        return array
+    def __init__(self):
+        super(SeapathBin11, self).__init__()
+        self.sp_dtype = self.dtype
 
     def read_line(self, data):
-        org_array = np.fromstring(data, dtype=self.sp_dtype)
+        org_array = np.frombuffer(data, dtype=self.sp_dtype)
         #print(org_array, len(org_array))
         converted_array = self.convert_array(org_array)
         return converted_array
 
-    def convert_array(self, array):
-        new_array = np.zeros((len(array)), dtype=self.new_dtype)
-        for item in self.new_dtype:
-            name = item[0]
-            try:
-                new_array[name] = array[name]
-            except ValueError:
-                continue
-        new_array['latitude'] = self.conv_pos(array['latitude'])
-        new_array['longitude'] = self.conv_pos(array['longitude'])
-        new_array['height'] = self.conv_cm(array['height'])
-        new_array['heave'] = self.conv_cm(array['heave']) * -1
-        new_array['north_vel'] = self.conv_cm(array['north_vel'])
-        new_array['east_vel'] = self.conv_cm(array['east_vel'])
-        new_array['down_vel'] = self.conv_cm(array['down_vel'])
-        new_array['roll'] = self.conv_atti(array['roll'])
-        new_array['pitch'] = self.conv_atti(array['pitch'])
-        new_array['heading'] = self.conv_heading(array['heading'])
-        new_array['roll_rate'] = self.conv_atti(array['roll_rate'])
-        new_array['pitch_rate'] = self.conv_atti(array['pitch_rate'])
-        new_array['yaw_rate'] = self.conv_atti(array['yaw_rate'])
-        new_array['utc_time'] = self.conv_time(array['utc_time'], array['utc_fraction'])
-        return new_array
-
-    def conv_pos(self, value):
-        return value * (90.0 / 2 ** 30)
-
-    def conv_heading(self, value):
-        return value * (360.0 / 2 ** 16)
-
-    def conv_time(self, posix, fraction):
-        return posix + (fraction * 0.0001)
-
-    def conv_cm(self, value):
-        return value * 0.01
-
-    def conv_atti(self, value):
-        return value * (90.0 / 2 ** 14)
-
-
-class SeapathBin26(object):
-    def __init__(self):
-        self.sp_dtype = [('Header1', '>u1'), ('Header2', '>u1'), ('utc_time', '>i4'),  ('utc_fraction','>u2'),
-                         ('latitude', '>i4'), ('longitude', '>i4'), ('height', '>i4'), ('heave', '>i2'),
-                         ('north_vel', '>i2'), ('east_vel', '>i2'), ('down_vel', '>i2'), ('roll', '>i2'), ('pitch','>i2'),
-                         ('heading', '>u2'), ('roll_rate', '>i2'), ('pitch_rate', '>i2'), ('yaw_rate', '>i2'),
-                         ('delayed_heave_time', '>i4'), ('delayed_heave_frac', '>u2'), ('delayed_heave', '>i2'),
-                         ('status', '>u2'), ('checksum', '>u2')]
-
-        self.new_dtype = [('Header1', '>u1'), ('Header2', '>u1'), ('utc_time', '>f8'),
-                         ('latitude', '>f8'), ('longitude', '>f8'), ('height', '>f8'), ('heave', '>f8'),
-                         ('north_vel', '>f8'), ('east_vel', '>f8'), ('down_vel', '>f8'), ('roll', '>f4'), ('pitch','>f4'),
-                         ('heading', '>f4'), ('roll_rate', '>f4'), ('pitch_rate', '>f4'), ('yaw_rate', '>f4'),
-                         ('delayed_heave_time', '>f8'), ('delayed_heave', '>f4'), ('status', '>u2'), ('checksum', '>u2')]
+    def validate(self, array):
+        valid = array['checksum'] == blkcrc(record_bytes(array)[:, 1:-2])
+        valid &= array['Header1'] == 0xAA
+        return valid
 
-    def read_file(self, filename):
-        array = np.fromfile(filename, dtype=self.sp_dtype)
-        return array
+
+@register('Seapath_bin26')
+class SeapathBin26(BinaryAbc):
+    time_field = 'utc_time'
+    sync = b'\xaa\x51'
+    checked = True
+    raw = [('Header1', '>u1'), ('Header2', '>u1'), ('utc_time', '>i4'),  ('utc_fraction', '>u2'),
+           ('latitude', '>i4'), ('longitude', '>i4'), ('height', '>i4'), ('heave', '>i2'),
+           ('north_vel', '>i2'), ('east_vel', '>i2'), ('down_vel', '>i2'), ('roll', '>i2'), ('pitch', '>i2'),
+           ('heading', '>u2'), ('roll_rate', '>i2'), ('pitch_rate', '>i2'), ('yaw_rate', '>i2'),
+           ('delayed_heave_time', '>i4'), ('delayed_heave_frac', '>u2'), ('delayed_heave', '>i2'),
+           ('status', '>u2'), ('checksum', '>u2')]
+
+    fields = seapath_fields(['Header1', 'Header2', 'utc_time', 'latitude', 'longitude', 'height', 'heave',
+                             'north_vel', 'east_vel', 'down_vel', 'roll', 'pitch', 'heading', 'roll_rate',
+                             'pitch_rate', 'yaw_rate', 'delayed_heave_time', 'delayed_heave', 'status', 'checksum'])
+
+    def __init__(self):
+        super(SeapathBin26, self).__init__()
+        self.sp_dtype = self.dtype
 
     def read_line(self, data):
-        org_array = np.fromstring(data, dtype=self.sp_dtype)
+        org_array = np.frombuffer(data, dtype=self.sp_dtype)
         #print(org_array, len(org_array))
         converted_array = self.convert_array(org_array)
         return converted_array
 
-    def convert_array(self, array):
-        new_array = np.zeros((len(array)), dtype=self.new_dtype)
-        for item in self.new_dtype:
-            name = item[0]
-            try:
-                new_array[name] = array[name]
-            except ValueError:
-                continue
-        new_array['latitude'] = self.conv_pos(array['latitude'])
-        new_array['longitude'] = self.conv_pos(array['longitude'])
-        new_array['height'] = self.conv_cm(array['height'])
-        new_array['heave'] = self.conv_cm(array['heave']) * -1
-        new_array['north_vel'] = self.conv_cm(array['north_vel'])
-        new_array['east_vel'] = self.conv_cm(array['east_vel'])
-        new_array['down_vel'] = self.conv_cm(array['down_vel'])
-        new_array['roll'] = self.conv_atti(array['roll'])
-        new_array['pitch'] = self.conv_atti(array['pitch'])
-        new_array['heading'] = self.conv_heading(array['heading'])
-        new_array['roll_rate'] = self.conv_atti(array['roll_rate'])
-        new_array['pitch_rate'] = self.conv_atti(array['pitch_rate'])
-        new_array['yaw_rate'] = self.conv_atti(array['yaw_rate'])
-        new_array['delayed_heave'] = self.conv_cm(array['delayed_heave']) * -1
-        new_array['delayed_heave_time'] = self.conv_time(array['delayed_heave_time'], array['delayed_heave_frac'])
-        new_array['utc_time'] = self.conv_time(array['utc_time'], array['utc_fraction'])
-        return new_array
-
-    def conv_pos(self, value):
-        return value * (90.0 / 2 ** 30)
-
-    def conv_heading(self, value):
-        return value * (360.0 / 2 ** 16)
-
-    def conv_time(self, posix, fraction):
-        return posix + (fraction * 0.0001)
-
-    def conv_cm(self, value):
-        return value * 0.01
-
-    def conv_atti(self, value):
-        return value * (90.0 / 2 ** 14)
-
-
-class VmmMruBin(object):
-    def __init__(self):
-        self._dtype = [('Header', '>u1'), ('Length', '>u1'), ('token', '>u1'),  ('Roll', '>f4'), ('Pitch', '>f4'),
-                       ('Yaw', '>f4'), ('Angular_Velocity_Roll', '>f4'), ('Angular_Velocity_Pitch', '>f4'),
-                       ('Angular_Velocity_Yaw', '>f4'), ('Linear_Velocity_Forward', '>f4'),
-                       ('Linear_Velocity_Starboard', '>f4'), ('Linear_Velocity_Down', '>f4'),
-                       ('Linear_Acceleration_Forward','>f4'), ('Linear_Acceleration_Starboard','>f4'),
-                       ('Linear_Acceleration_Down', '>f4'), ('fraction_time', '>i4'), ('checksum', '>u1')]
-
-        self.new_dtype = [('utc_time', '<f8'), ('Header', '>u1'), ('Length', '>u1'), ('token', '>u1'), ('Roll', '>f4'), ('Pitch', '>f4'),
-                   ('Yaw', '>f4'), ('Angular_Velocity_Roll', '>f4'), ('Angular_Velocity_Pitch', '>f4'),
-                   ('Angular_Velocity_Yaw', '>f4'), ('Linear_Velocity_Forward', '>f4'),
-                   ('Linear_Velocity_Starboard', '>f4'), ('Linear_Velocity_Down', '>f4'),
-                   ('Linear_Acceleration_Forward', '>f4'), ('Linear_Acceleration_Starboard', '>f4'),
-                   ('Linear_Acceleration_Down', '>f4'), ('fraction_time', '>i4'), ('checksum', '>u1')]
+    def validate(self, array):
+        valid = array['checksum'] == blkcrc(record_bytes(array)[:, 2:-2])
+        valid &= (array['Header1'] == 0xAA) & (array['Header2'] == 0x51)
+        return valid
 
-    def read_file(self, filename):
-        array = np.fromfile(filename, dtype=self._dtype)
-        return array
 
-    def convert_array(self, array):
-        new_array = array.astype(self.new_dtype)
-        new_array['Roll'] = np.rad2deg(array['Roll'])
-        new_array['Pitch'] = np.rad2deg(array['Pitch'])
-        new_array['Yaw'] = np.rad2deg(array['Yaw'])
-        new_array['Angular_Velocity_Roll'] = np.rad2deg(array['Angular_Velocity_Roll'])
-        new_array['Angular_Velocity_Pitch'] = np.rad2deg(array['Angular_Velocity_Pitch'])
-        new_array['Angular_Velocity_Yaw'] = np.rad2deg(array['Angular_Velocity_Yaw'])
-        return new_array
-
-    def make_time(self, array, date_time):
-        year = date_time[0]
-        month = date_time[1]
-        day = date_time[2]
-        hour = date_time[3]
-        minute = date_time[4]
-        second = date_time[5]
-        indexes = np.where(np.diff(array['fraction_time']) < 0)[0]
-        init_time = self.calcEpoch(year, month, day, hour, minute, second)
-        array['utc_time'] = array['fraction_time'] * 1e-9 + init_time
-        for x in range(len(indexes)):
-            st = indexes[x] + 1
-            try:
-                en = indexes[x + 1] + 1
-            except IndexError:
-                en = len(array)
-            array['utc_time'][st:en] += x + 1
-        return
-
-    def calcEpoch(self, YY, MM, DD, HH, mm, ss):
-        dt = datetime.datetime(1970, 1, 1)
-        return (datetime.datetime(YY, MM, DD, HH, mm, ss) - dt).total_seconds()
+VMM_ANGLES = ['Roll', 'Pitch', 'Yaw', 'Angular_Velocity_Roll', 'Angular_Velocity_Pitch', 'Angular_Velocity_Yaw']
+
 
+@register('VMM_MRU_Binary')
+class VmmMruBin(BinaryAbc):
+    # the length byte is the telegram size, the only byte that is the same in every telegram of every unit
+    sync = b'\x38'
+    sync_offset = 1
+    raw = [('Header', '>u1'), ('Length', '>u1'), ('token', '>u1'),  ('Roll', '>f4'), ('Pitch', '>f4'),
+           ('Yaw', '>f4'), ('Angular_Velocity_Roll', '>f4'), ('Angular_Velocity_Pitch', '>f4'),
+           ('Angular_Velocity_Yaw', '>f4'), ('Linear_Velocity_Forward', '>f4'),
+           ('Linear_Velocity_Starboard', '>f4'), ('Linear_Velocity_Down', '>f4'),
+           ('Linear_Acceleration_Forward', '>f4'), ('Linear_Acceleration_Starboard', '>f4'),
+           ('Linear_Acceleration_Down', '>f4'), ('fraction_time', '>i4'), ('checksum', '>u1')]
+
+    fields = [Field('utc_time', '<f8', value=0)] + \
+        [Field(name, kind, unit='rad' if name in VMM_ANGLES else None) for name, kind in raw]
 
-class Kmbinary(object):
     def __init__(self):
-        # dtype to construct a array that exactly matches the binary format
-        self.sp_dtype = [('id', '<a4'), ('length', '<u2'), ('version', '<u2'),  ('utc_seconds', '<u4'),
-                         ('utc_nanos', '<u4'), ('status', '<u4'),
-                         ('latitude', '<f8'), ('longitude', '<f8'), ('height', '<f4'), ('roll', '<f4'), ('pitch', '<f4'),
-                         ('heading', '<f4'), ('heave', '<f4'), ('roll_rate', '<f4'), ('pitch_rate', '<f4'),
-                         ('yaw_rate', '<f4'), ('north_vel', '<f4'), ('east_vel', '<f4'), ('down_vel', '<f4'),
-                         ('latitude_error', '<f4'), ('longitude_error', '<f4'), ('height_error', '<f4'),
-                         ('roll_error', '<f4'), ('pitch_error', '<f4'), ('heading_error', '<f4'), ('heave_error', '<f4'),
-                         ('north_acceleration', '<f4'), ('east_acceleration', '<f4'), ('down_acceleration', '<f4'),
-                         ('delayed_seconds', '<u4'), ('delayed_nanos', '<u4'), ('delayed_heave', '<f4')]
-        # dtype that is designed to fit som conversion of certain data points, ie time and time fraction to epoch time
-        self.new_dtype = [('utc_time', '<f8'), ('latitude', '<f8'), ('longitude', '<f8'), ('height', '<f4'),
-                             ('roll', '<f4'), ('pitch', '<f4'), ('heading', '<f4'), ('heave', '<f4'),
-                             ('roll_rate', '<f4'), ('pitch_rate', '<f4'), ('yaw_rate', '<f4'), ('north_vel', '<f4'),
-                             ('east_vel', '<f4'), ('down_vel', '<f4'), ('latitude_error', '<f4'),
-                             ('longitude_error', '<f4'), ('height_error', '<f4'), ('roll_error', '<f4'),
-                             ('pitch_error', '<f4'), ('heading_error', '<f4'), ('heave_error', '<f4'),
-                             ('north_acceleration', '<f4'), ('east_acceleration', '<f4'), ('down_acceleration', '<f4'),
-                             ('delayed_time', '<f8'), ('delayed_heave', '<f4'), ('status_horiz_pos_vel', '<u4'),
-                             ('status_roll_pitch', '<u4'), ('status_heading', '<u4'), ('status_heave_vec', '<u4'),
-                             ('status_acceleration', '<u4'), ('status_delayed', '<u4')]
-
-    def isKthBitSet(self, n, k):
-        if n & (1 << (k - 1)):
-            return True
+        super(VmmMruBin, self).__init__()
+        self._dtype = self.dtype
+
+    def validate(self, array):
+        # no checksum algorithm is known for this format and the length byte is the sync, only accept plausible
+        # angles and a nano second counter within the second
+        valid = (array['fraction_time'] >= 0) & (array['fraction_time'] < 10**9)
+        for name in ['Roll', 'Pitch', 'Yaw']:
+            valid &= np.abs(array[name]) <= 2 * np.pi
+        return valid
+
+    def evidence(self, array):
+        # text and other bytes that are not floats mostly read as tiny angles, motion seldom passes that close to 0
+        tiny = np.zeros(len(array), dtype=bool)
+        for name in ['Roll', 'Pitch', 'Yaw']:
+            angle = np.abs(array[name])
+            tiny |= (angle > 0) & (angle < 1e-6)
+        return super(VmmMruBin, self).evidence(array) * (1 - np.mean(tiny)) if len(array) else 0.0
+
+    def time_steps(self, array):
+        # the counter rolls over every second
+        return np.diff(array['fraction_time'].astype(np.int64)) % 10**9 * 1e-9
+
+    def make_time(self, array, date_time, state=None):
+        '''
+        the fraction time is a nano second counter that rolls over every second, each roll over adds one second.
+        :param date_time: (year, month, day, hour, minute, second) tuple, datetime or epoch float. (start, interval)
+        as for EM3000 is taken as start, the interval is given by the counter.
+        :param state: dict returned by the previous call when the file is processed in chunks.
+        :return: state to pass on with the next chunk
+        '''
+        if not isinstance(date_time, (datetime.datetime, int, float, np.number)) and len(date_time) == 2:
+            date_time = date_time[0]
+        fraction = array['fraction_time']
+        if len(fraction) == 0:
+            return state
+        if state:
+            rollovers = np.cumsum(np.diff(fraction, prepend=state['fraction_time']) < 0) + state['rollovers']
         else:
-            return False
+            rollovers = np.cumsum(np.diff(fraction, prepend=fraction[0]) < 0)
+        array['utc_time'] = fraction * 1e-9 + self.epoch(date_time)
+        array['utc_time'] += rollovers
+        return {'rollovers': int(rollovers[-1]), 'fraction_time': fraction[-1]}
+
+
+KMB_STATUS_BITS = [('status_horiz_pos_vel', 0, 16), ('status_roll_pitch', 1, 17), ('status_heading', 2, 18),
+                   ('status_heave_vec', 3, 19), ('status_acceleration', 4, 20), ('status_delayed', 5, 21)]
+
+
+@register('KMBIN')
+class Kmbinary(BinaryAbc):
+    time_field = 'utc_time'
+    sync = b'#KMB'
+    checked = True
+    container = True
+    # bytes scanned for headers where the record grid breaks, more than the longest record (16 bit length)
+    scan_bytes = 2**18
+    # dtype to construct a array that exactly matches the binary format
+    raw = [('id', 'S4'), ('length', '<u2'), ('version', '<u2'),  ('utc_seconds', '<u4'),
+           ('utc_nanos', '<u4'), ('status', '<u4'),
+           ('latitude', '<f8'), ('longitude', '<f8'), ('height', '<f4'), ('roll', '<f4'), ('pitch', '<f4'),
+           ('heading', '<f4'), ('heave', '<f4'), ('roll_rate', '<f4'), ('pitch_rate', '<f4'),
+           ('yaw_rate', '<f4'), ('north_vel', '<f4'), ('east_vel', '<f4'), ('down_vel', '<f4'),
+           ('latitude_error', '<f4'), ('longitude_error', '<f4'), ('height_error', '<f4'),
+           ('roll_error', '<f4'), ('pitch_error', '<f4'), ('heading_error', '<f4'), ('heave_error', '<f4'),
+           ('north_acceleration', '<f4'), ('east_acceleration', '<f4'), ('down_acceleration', '<f4'),
+           ('delayed_seconds', '<u4'), ('delayed_nanos', '<u4'), ('delayed_heave', '<f4')]
+    # columns designed to fit som conversion of certain data points, ie time and time fraction to epoch time
+    fields = [Field('utc_time', '<f8', src='utc_seconds', frac='utc_nanos', frac_div=10.0**9)] + \
+        [Field(name, kind) for name, kind in raw[6:29]] + \
+        [Field('delayed_time', '<f8', src='delayed_seconds', frac='delayed_nanos', frac_div=10.0**9),
+         Field('delayed_heave', '<f4')] + \
+        [Field(name, '<u4', src='status', bits=(invalid, reduced)) for name, invalid, reduced in KMB_STATUS_BITS]
+
+    def __init__(self):
+        super(Kmbinary, self).__init__()
+        # status column, bit set for invalid data and bit set for reduced performance in the status word
+        self.status_bits = KMB_STATUS_BITS
+        self.sp_dtype = self.dtype
+
+    def decode_status(self, status):
+        '''
+        decode status words to one column pr. sensor group, 0 is ok, 1 is reduced performance and 2 is invalid data.
+        invalid takes presedence when both bits are set. works on a single telegram as well as a whole file.
+        '''
+        status = np.atleast_1d(np.asarray(status, dtype=np.uint32))
+        decoded = np.empty(len(status), dtype=[(name, '<u4') for name, _, _ in self.status_bits])
+        for name, invalid, reduced in self.status_bits:
+            decoded[name] = status_column(status, invalid, reduced)
+        return decoded
 
     def mod_status(self, status, array):
-        names = ['status_horiz_pos_vel', 'status_roll_pitch', 'status_heading', 
-                 'status_heave_vec', 'status_acceleration',
-                 'status_delayed']*2
-        uniq = np.unique(status)
-        print(uniq, len(uniq))
-        for i in uniq:
-            where = np.where(status == i)[0]
-            for x, name in zip([1,2,3,4,5,16,17,18,19,20,21], names):
-                if self.isKthBitSet(i, x):
-                    if x <= 6:
-                        v = 2
-                    if x >= 6:
-                        v = 1
-                    array[name][where] = v
+        decoded = self.decode_status(status)
+        for name in decoded.dtype.names:
+            array[name] = decoded[name]
+
+    def read_container(self, filename):
+        '''
+        every record type of a KM binary log, a log can have records of other types and versions in between the
+        #KMB records. see container.ContainerParser.
+        :return: dict of (id, version): record array
+        '''
+        from binary_formats.container import ContainerParser
+        return ContainerParser({self.sync: self.sp_dtype}).parse_file(filename)
+
+    def record_table(self, data):
+        '''
+        the #KMB records of a uint8 array in file order, found by the header chain (container.scan) so records of
+        other types and lengths in between them are skipped instead of read as garbage. newer versions are longer and
+        are read by the fields of this one.
+        :return: container.TABLE_DTYPE rows of the #KMB records and the FrameStats of the scan, where the records of
+        other types are not counted as skipped
+        '''
+        from binary_formats.container import scan
+        table, stats = scan(data)
+        table = table[self.validate(table)]
+        stats.records = len(table)
+        self.scan_stats = stats
+        return table, stats
+
+    def on_grid(self, array):
+        '''true for the records with the header of a #KMB record of this version, the check of the fixed grid'''
+        sync = np.frombuffer(self.sync, dtype='<u4')[0]
+        return (array['id'].view('<u4') == sync) & (array['length'] == np.dtype(self.sp_dtype).itemsize)
+
+    def frame(self, data, check=True):
+        '''
+        the #KMB records of a block of raw bytes. the records are taken on the fixed grid while every header is a #KMB
+        header of this version, only where the grid breaks the headers are scanned (container.scan) until it holds
+        again. so records of other types, newer versions and damaged bytes only cost a scan of the stretch they are
+        in, and a clean log is read at about the speed of a copy.
+        :return: record array and the FrameStats of the block, where records of other types are not skipped
+        '''
+        from binary_formats.container import scan
+        data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.view(np.uint8)
+        dtype = np.dtype(self.sp_dtype)
+        size = dtype.itemsize
+        stats = FrameStats()
+        stats.total_bytes = len(data)
+        # every #KMB record is at least size long, the records are copied once into the result
+        records = np.empty(len(data) // size, dtype=dtype)
+        grid = max(1, 2**24 // size)
+        found = 0
+        position = 0
+        while position < len(data):
+            count = min(grid, (len(data) - position) // size)
+            block = records[found:found + count]
+            block.view(np.uint8)[:] = data[position:position + count * size]
+            bad = np.flatnonzero(~self.on_grid(block))
+            good = int(bad[0]) if len(bad) else count
+            found += good
+            position += good * size
+            if good:
+                stats.end = position
+            if position >= len(data) or (good == count and position + size <= len(data)):
+                continue
+            # the grid breaks here or less than a record is left, the headers of a stretch are scanned
+            window = data[position:position + self.scan_bytes]
+            table, scanned = scan(window)
+            rows = table[self.validate(table)]
+            records[found:found + len(rows)] = extract(window, rows['offset'], dtype)
+            found += len(rows)
+            if scanned.end:
+                stats.end = position + scanned.end
+            if position + len(window) < len(data):
+                # the grid is tried again after the last record, the bytes after it are scanned again if it breaks
+                end = block_end(self, scanned, len(window))
+            else:
+                end = len(window)
+            scanned.records = 0
+            stats.add(scanned)
+            position += end
+        stats.records = found
+        self.scan_stats = stats
+        records = records[:found] if found > len(records) // 2 else records[:found].copy()
+        return records, stats
+
+    def byte_window(self, data, start=None, end=None):
+        '''
+        first and last + 1 byte of the #KMB records of a uint8 array (memory map) with start <= time <= end. the
+        bytes are bisected and the first record at or after a byte is found by scanning a short stretch, so about
+        2 * log2(n bytes) stretches are read whatever is in between the records. time stamps are taken as increasing.
+        '''
+        from binary_formats.container import scan
+
+        def first_record(position):
+            # a short stretch holds a record unless the log is damaged or has long records of other types there
+            size = 2**12
+            while True:
+                window = data[position:position + size]
+                table = scan(window)[0]
+                rows = table[self.validate(table)]
+                if len(rows):
+                    record = extract(window, rows['offset'][:1], self.sp_dtype)
+                    return position + int(rows['offset'][0]), self.record_time(record)[0]
+                if size >= self.scan_bytes or position + size >= len(data):
+                    return len(data), np.inf
+                size *= 4
+
+        def bisect(value, right):
+            '''
+            record that starts the bytes where the time passes value. the bisection stops at a short stretch, the
+            records of it outside the window are masked away later (ReadBinFIle.window)
+            '''
+            low, high = 0, len(data)
+            while high - low > 2**16:
+                mid = (low + high) // 2
+                offset, time = first_record(mid)
+                if time < value or (right and time == value):
+                    low = offset + 1
+                else:
+                    high = mid
+            # the records before low are before value, the records from the first one after high are past it
+            position = high if right else low
+            return first_record(position)[0] if position < len(data) else len(data)
+
+        first = 0 if start is None else bisect(start, False)
+        last = len(data) if end is None else bisect(end, True)
+        return first, max(first, last)
 
     def read_file(self, filename):
-        array = np.fromfile(filename, dtype=self.sp_dtype)
-        return array
+        return self.frame_file(filename)[0]
+
+    def memmap_file(self, filename):
+        '''
+        the #KMB records of a log without reading them into memory. a log of only #KMB records of this version is
+        mapped on its record grid, which is checked block by block. else the records are found by a scan of the whole
+        log and read from the map by their offsets when they are sliced (container.RecordMap).
+        '''
+        from binary_formats.container import RecordMap
+        size = np.dtype(self.sp_dtype).itemsize
+        count = os.path.getsize(filename) // size
+        if count == 0:
+            return np.zeros(0, dtype=self.sp_dtype)
+        array = np.memmap(filename, dtype=self.sp_dtype, mode='r', shape=(count,))
+        if all(self.on_grid(array[start:start + 2**20]).all() for start in range(0, count, 2**20)):
+            return array
+        data = np.memmap(filename, dtype=np.uint8, mode='r')
+        return RecordMap(data, self.record_table(data)[0]['offset'], self.sp_dtype)
 
     def read_line(self, data):
-        org_array = np.fromstring(data, dtype=self.sp_dtype)
+        org_array = np.frombuffer(data, dtype=self.sp_dtype)
         converted_array = self.convert_array(org_array)
         return converted_array
 
-    def convert_array(self, array, modtime=False):
-        new_array = np.zeros((len(array)), dtype=self.new_dtype)
-        for item in self.new_dtype:
-            name = item[0]
-            try:
-                new_array[name] = array[name]
-            except ValueError:
-                continue
-        new_array['utc_time'] = self.conv_time(array['utc_seconds'], array['utc_nanos'])
-        new_array['delayed_time'] = self.conv_time(array['delayed_seconds'], array['delayed_nanos'])
-        self.mod_status(array['status'], new_array)
-        return new_array
-
     def conv_time(self, epoch, nanofrac):
         return epoch + (nanofrac / 10.0**9)
 
+    def validate(self, array):
+        # newer versions append fields, they are longer
+        return (array['id'] == self.sync) & (array['length'] >= np.dtype(self.sp_dtype).itemsize)
 
-class sbet(object):
-    def __init__(self):
-        # dtype to construct a array that exactly matches the binary format
-        self.dtype = [('utc_time', 'f8'), ('latitude', 'f8'), ('longitude', 'f8'), ('height', 'f8'),
-                      ('x_velocity', 'f8'),('y_velocity', 'f8'), ('z_velocity', 'f8'), ('roll', 'f8'), ('pitch', 'f8'),
-                      ('heading', 'f8'),('wander_angle', 'f8'), ('x_acceleration', 'f8'), ('y_acceleration', 'f8'),
-                      ('z_acceleration', 'f8'),('x_angular_rate', 'f8'), ('y_angular_rate', 'f8'), ('z_angular_rate', 'f8')]
 
-    def read_file(self, filename):
-        array = np.fromfile(filename, dtype=self.dtype)
-        array = self.convert_rad(array)
-        return array
+SBET_RADIANS = ['latitude', 'longitude', 'roll', 'pitch', 'x_angular_rate', 'y_angular_rate', 'z_angular_rate']
 
 
-    def convert_rad(self, array):
-        for name in ['latitude', 'longitude', 'roll', 'pitch', 'x_angular_rate', 'y_angular_rate', 'z_angular_rate']:
-            array[name] = np.rad2deg(array[name])
-        array['heading'] = conv_head(array['heading'])
-        return array
-
+@register('SBET')
+class sbet(BinaryAbc):
+    time_field = 'utc_time'  # gps seconds of the week
+    # dtype to construct a array that exactly matches the binary format
+    raw = [('utc_time', 'f8'), ('latitude', 'f8'), ('longitude', 'f8'), ('height', 'f8'),
+           ('x_velocity', 'f8'), ('y_velocity', 'f8'), ('z_velocity', 'f8'), ('roll', 'f8'), ('pitch', 'f8'),
+           ('heading', 'f8'), ('wander_angle', 'f8'), ('x_acceleration', 'f8'), ('y_acceleration', 'f8'),
+           ('z_acceleration', 'f8'), ('x_angular_rate', 'f8'), ('y_angular_rate', 'f8'), ('z_angular_rate', 'f8')]
 
-class PfreeHeave(object):
-    def __init__(self):
-        self.dtype = [('Header1', '>u1'), ('Header2', '>u1'), ('posix', '>i4'),  ('fraction', '>u2'),
-                      ('heave', '>i2'), ('status', '>u1'), ('checksum', '>u2')]
+    fields = [Field(name, kind, unit='rad' if name in SBET_RADIANS else None,
+                    func=conv_head if name == 'heading' else None) for name, kind in raw]
 
-        self.conv_dtype = [('Header1', '>u1'), ('Header2', '>u1'), ('utc_time', '>f8'),
-                           ('heave', '>f4'), ('status', '>u1'), ('checksum', '>u2')]
+    def convert_rad(self, array):
+        return self.convert_array(array)
+
+    def validate(self, array):
+        # no header or checksum, accept gps seconds of week and positions in radians
+        valid = (array['utc_time'] >= 0) & (array['utc_time'] <= 7 * 86400)
+        valid &= (np.abs(array['latitude']) <= np.pi / 2) & (np.abs(array['longitude']) <= 2 * np.pi)
+        # a position of exactly 0, 0 is a row of zeros or columns of zeros read at the wrong offset
+        valid &= (array['latitude'] != 0) | (array['longitude'] != 0)
+        # bytes that are not doubles mostly read as denormals, tiny or huge numbers
+        for name in array.dtype.names:
+            value = np.abs(array[name])
+            valid &= (value == 0) | ((value >= np.finfo(np.float64).tiny) & (value < 1e12))
+        return valid
+
+
+@register('PFreeHeave')
+class PfreeHeave(BinaryAbc):
+    time_field = 'utc_time'
+    sync = b'\xaa\x51'
+    checked = True
+    raw = [('Header1', '>u1'), ('Header2', '>u1'), ('posix', '>i4'),  ('fraction', '>u2'),
+           ('heave', '>i2'), ('status', '>u1'), ('checksum', '>u2')]
+
+    fields = [Field('Header1', '>u1'), Field('Header2', '>u1'),
+              Field('utc_time', '>f8', src='posix', frac='fraction', frac_div=10.0**4),
+              Field('heave', '>f4', scale=0.01), Field('status', '>u1'), Field('checksum', '>u2')]
 
-    def read_file(self, filename):
-        array = np.fromfile(filename, dtype=self.dtype)
-        return array
+    def __init__(self):
+        super(PfreeHeave, self).__init__()
+        self.conv_dtype = self.new_dtype
 
     def read_line(self, data):
-        org_array = np.fromstring(data, dtype=self.dtype)
+        org_array = np.frombuffer(data, dtype=self.dtype)
         #print(org_array, len(org_array))
         converted_array = self.convert_array(org_array)
         return converted_array
 
-    def convert_array(self, array):
-        new_array = np.zeros((len(array)), dtype=self.conv_dtype)
-        for item in self.conv_dtype:
-            name = item[0]
-            try:
-                new_array[name] = array[name]
-            except ValueError:
-                continue
-        new_array['utc_time'] = array['posix'] + (array['fraction'] / 10.0**4)
-        new_array['heave'] = array['heave'] * 0.01
-
-        return new_array
+    def validate(self, array):
+        valid = array['checksum'] == blkcrc(record_bytes(array)[:, 2:-2])
+        valid &= (array['Header1'] == 0xAA) & (array['Header2'] == 0x51)
+        return valid
@@ -0,0 +1,305 @@
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _crc_table():
+    table = np.zeros(256, dtype=np.uint16)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0x8408
+            else:
+                crc >>= 1
+        table[i] = crc
+    return table
+
+
+_CRC_TABLES = []
+
+
+def crc_tables():
+    '''
+    the crc table and the same crc advanced by two bytes at the time, indexed by the crc xor the next little endian
+    byte pair. made the first time a checksum is computed.
+    '''
+    if not _CRC_TABLES:
+        table = _crc_table()
+        low = np.arange(2**16, dtype=np.uint32) & 0xFF
+        table2 = ((table[low] >> 8) ^ table[((np.arange(2**16) >> 8) ^ table[low]) & 0xFF]).astype(np.uint16)
+        _CRC_TABLES.extend([table, table2])
+    return _CRC_TABLES
+
+
+def blkcrc(data):
+    '''
+    16 bit block crc (CRC-CCITT, reflected) used by the Seapath binary telegrams, computed for all rows of a
+    (n records, n bytes) uint8 array at once. the loop is over the byte columns two at the time, not the records.
+    returns the value as it reads from the big endian checksum field.
+    '''
+    table, table2 = crc_tables()
+    count, width = data.shape
+    pairs = width // 2
+    out = np.empty(count, dtype=np.uint16)
+    for start in range(0, count, 2**14):
+        block = data[start:start + 2**14]
+        crc = np.full(len(block), 0xFFFF, dtype=np.uint16)
+        if pairs:
+            # one contiguous row pr. byte pair and in place lookups, a block of records stays in the cache
+            words = np.ascontiguousarray(block[:, :pairs * 2]).view('<u2').T.copy()
+            index = np.empty_like(crc)
+            for column in words:
+                np.bitwise_xor(crc, column, out=index)
+                np.take(table2, index, out=crc)
+        if width % 2:
+            crc = (crc >> 8) ^ table[(crc ^ block[:, -1]) & 0xFF]
+        crc = ~crc
+        out[start:start + len(block)] = (crc << 8) | (crc >> 8)
+    return out
+
+
+def record_bytes(array):
+    '''
+    view a structured record array as a (n records, record size) uint8 array
+    '''
+    array = np.ascontiguousarray(array)
+    return array.view(np.uint8).reshape(len(array), array.dtype.itemsize)
+
+
+def extract(data, positions, dtype):
+    '''
+    copy the records of dtype that start at positions (sorted) out of a uint8 array into a record array
+    '''
+    dtype = np.dtype(dtype)
+    size = dtype.itemsize
+    count = len(positions)
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    first = positions[0]
+    if positions[-1] - first == (count - 1) * size and np.all(np.diff(positions) == size):
+        # clean stretch, records are back to back
+        raw = np.array(data[first:first + count * size])
+    else:
+        raw = sliding_window_view(data[first:positions[-1] + size], size)[positions - first]
+    return raw.view(dtype).reshape(count)
+
+
+def drop_overlaps(positions, sizes, last_end=0):
+    '''
+    keep the first of every group of overlapping records. only the rare clusters of overlapping candidates are
+    resolved in python, the clean bulk of the file is left to numpy.
+    :param sizes: record size, a scalar or one size for each position
+    :return: bool array, true for the positions to keep
+    '''
+    keep = positions >= last_end
+    ends = positions + sizes
+    if len(positions) == 0 or (keep[0] and np.all(positions[1:] >= ends[:-1]) and np.all(np.diff(ends) >= 0)):
+        return keep
+    reach = np.maximum.accumulate(np.where(keep, ends, last_end))
+    overlap = np.flatnonzero(keep[1:] & (positions[1:] < reach[:-1])) + 1
+    if len(overlap) == 0:
+        return keep
+    end = last_end
+    for i in np.union1d(overlap - 1, overlap):
+        if not keep[i]:
+            continue
+        if positions[i] < end:
+            keep[i] = False
+        else:
+            end = max(end, ends[i])
+    return keep
+
+
+class FrameStats(object):
+    def __init__(self):
+        self.total_bytes = 0
+        self.records = 0
+        self.rejected = 0
+        self.skipped_bytes = 0
+        self.skipped_records = 0
+        self.end = 0  # offset just past the last record found
+
+    def add(self, stats):
+        '''sum the counts of the stats of an other block into these'''
+        for name in ('records', 'rejected', 'skipped_bytes', 'skipped_records'):
+            setattr(self, name, getattr(self, name) + getattr(stats, name))
+
+    def __repr__(self):
+        return 'FrameStats(records=%d, rejected=%d, skipped_bytes=%d, skipped_records=%d)' % (
+            self.records, self.rejected, self.skipped_bytes, self.skipped_records)
+
+
+def block_end(fmt, stats, length):
+    '''
+    end of the bytes of a framed block that are done with when more data follows, the bytes after it could still be
+    the start of a record and are framed again with the next block. a record of a container format can be of any
+    length up to its 16 bit length field. the stats are corrected for the bytes that are kept.
+    '''
+    longest = 2**16 if fmt.container else np.dtype(fmt.dtype).itemsize
+    end = max(stats.end, length - longest + 1)
+    stats.skipped_bytes -= length - end
+    if stats.end == end < length:
+        # the partial record at the end is not skipped
+        stats.skipped_records -= 1
+    return end
+
+
+class Framer(object):
+    '''
+    finds telegrams by their sync header instead of assuming a perfect back to back sequence of records, so a
+    dropped or inserted byte only costs the damaged record. the records are validated with the sync and the formats
+    own checksum (fmt.validate), on the record grid while it holds and by searching for the sync where it breaks.
+    formats without a sync are searched at every byte and only taken where a run of records validates and steps
+    forward in time.
+    check=True computes the checksum of every record, on a clean Seapath log that is some 5 to 8 times the time of
+    reading the file with np.fromfile. check=False only compares the sync bytes.
+    '''
+    def __init__(self, fmt, check=True, block_size=2**24):
+        self.fmt = fmt
+        self.dtype = np.dtype(fmt.dtype)
+        self.check = check
+        self.block_size = block_size
+        # the sync is declared by the format, bytes that only happen to be constant in a file (status, data) are
+        # never used as one
+        self.pattern = fmt.sync_pattern()
+        # without a sync every byte is a candidate and a single record is easily valid by chance, the records that
+        # follow on its grid have to be valid as well
+        self.confirm = 1 if self.pattern else 4
+        self.stats = FrameStats()
+
+    def candidates(self, block):
+        size = self.dtype.itemsize
+        count = len(block) - size + 1
+        if count <= 0:
+            return np.zeros(0, dtype=np.intp)
+        if not self.pattern:
+            return np.arange(count)
+        offset, value = self.pattern[0]
+        mask = block[offset:offset + count] == value
+        for offset, value in self.pattern[1:]:
+            mask &= block[offset:offset + count] == value
+        return np.flatnonzero(mask)
+
+    def frame(self, data):
+        '''
+        the records are taken on the fixed grid from the last good record and validated in bulk, the candidate search
+        only runs from where the grid breaks until the next good record. the validated grid is the result, the
+        records are not copied again.
+        :param data: bytes, bytearray, uint8 array or memory map of the raw log
+        :return: structured record array and the FrameStats of the run
+        '''
+        data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.view(np.uint8)
+        size = self.dtype.itemsize
+        self.stats = FrameStats()
+        self.stats.total_bytes = len(data)
+        grid = max(1, self.block_size // size)
+        # the records are copied once, straight from the data into the result
+        records = np.empty(len(data) // size, dtype=self.dtype)
+        found = 0
+        last_end = 0
+        position = 0
+        while position + size <= len(data):
+            count = min(grid, (len(data) - position) // size, len(records) - found)
+            block = records[found:found + count]
+            block.view(np.uint8)[:] = data[position:position + count * size]
+            bad = np.flatnonzero(~self.valid(block))
+            good = int(bad[0]) if len(bad) else count
+            if good:
+                self.count_skipped(np.array([position]), last_end)
+                found += good
+                last_end = position + good * size
+            position += good * size
+            if good < count:
+                self.stats.rejected += 1
+                position = self.resync(data, position + 1, records[found - 1:found])
+        self.count_skipped(np.array([len(data)]), last_end)
+        self.stats.end = last_end
+        records = records[:found] if found > len(records) // 2 else records[:found].copy()
+        self.stats.records = len(records)
+        return records, self.stats
+
+    def valid(self, records):
+        '''sync bytes, and the checksum or other checks of the format when check is on'''
+        rows = record_bytes(records)
+        valid = np.ones(len(records), dtype=bool)
+        for offset, value in self.pattern:
+            valid &= rows[:, offset] == value
+        if self.check:
+            valid &= self.fmt.validate(records)
+        return valid
+
+    def resync(self, data, start, previous=None):
+        '''
+        position of the first good record at or after start, found by the candidate search. the end of the data if
+        there is none.
+        :param previous: the last good record before start, if any
+        '''
+        size = self.dtype.itemsize
+        # every byte is checked without a sync, keep the window of candidates small
+        window = max(2**16, 64 * size) if self.pattern else 16 * size
+        while start + size <= len(data):
+            block = data[start:start + window + size - 1]
+            positions = self.candidates(block)
+            positions = positions[positions < window] + start
+            if len(positions):
+                valid = self.confirmed(data, positions)
+                if valid.any():
+                    first = int(np.argmax(valid))
+                    first = self.continuing(data, positions, valid, previous, first)
+                    self.stats.rejected += first
+                    return int(positions[first])
+                self.stats.rejected += len(valid)
+            start += window
+        return len(data)
+
+    def confirmed(self, data, positions):
+        '''
+        valid records at the positions, followed by confirm - 1 valid records on their grid with time stamps that
+        step forward. records past the end of the data are not required.
+        '''
+        size = self.dtype.itemsize
+        valid = np.ones(len(positions), dtype=bool)
+        timed = self.confirm > 1 and self.fmt.time_field is not None
+        last = None
+        for i in range(self.confirm):
+            following = positions + i * size
+            check = valid & (following + size <= len(data))
+            records = self.extract(data, following[check])
+            valid[check] = self.valid(records)
+            if timed:
+                time = np.full(len(positions), np.nan)
+                time[check] = self.fmt.record_time(records)
+                if last is not None:
+                    valid[check] &= time[check] > last[check]
+                last = time
+        return valid
+
+    def continuing(self, data, positions, valid, previous, first):
+        '''
+        without a sync other columns can read as a run of valid records, the record that continues the time of the
+        previous record is taken before them. the first valid one if none does.
+        '''
+        if self.confirm == 1 or self.fmt.time_field is None or previous is None or not len(previous):
+            return first
+        index = np.flatnonzero(valid)
+        time = self.fmt.record_time(self.extract(data, positions[index]))
+        later = np.flatnonzero(time > self.fmt.record_time(previous)[0])
+        if not len(later):
+            return first
+        return int(index[later[np.argmin(time[later])]])
+
+    def frame_file(self, filename):
+        if os.path.getsize(filename) == 0:
+            return self.frame(np.zeros(0, dtype=np.uint8))
+        return self.frame(np.memmap(filename, dtype=np.uint8, mode='r'))
+
+    def extract(self, data, positions):
+        return extract(data, positions, self.dtype)
+
+    def count_skipped(self, positions, last_end):
+        size = self.dtype.itemsize
+        gaps = positions - np.concatenate(([last_end], positions[:-1] + size))
+        gaps = gaps[gaps > 0]
+        self.stats.skipped_bytes += int(gaps.sum())
+        self.stats.skipped_records += int((-(-gaps // size)).sum())
@@ -0,0 +1,162 @@
+import asyncio
+import numpy as np
+from binary_formats.formats import FORMATS
+from binary_formats.framing import Framer
+
+
+class LiveStats(object):
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.records = 0
+        self.rejected = 0
+        self.dropped_packets = 0
+        self.dropped_bytes = 0
+        self.batches = 0
+
+    def __repr__(self):
+        return 'LiveStats(packets=%d, records=%d, rejected=%d, dropped_packets=%d, dropped_bytes=%d, batches=%d)' % (
+            self.packets, self.records, self.rejected, self.dropped_packets, self.dropped_bytes, self.batches)
+
+
+class TelegramBatcher(object):
+    '''
+    collects the telegrams of one sensor in a preallocated buffer and converts them in batches with the format class,
+    instead of one tiny array pr. telegram. a batch is converted and handed to the subscribers when the buffer is
+    full, or at the latest max_latency seconds after the first telegram of the batch arrived.
+    :param fmt: format name or format instance
+    :param resync: find the telegrams by their sync header, for byte streams (serial, tcp) where alignment can be lost
+    '''
+    def __init__(self, fmt, batch_size=256, max_latency=0.05, date_time=None, check=True, resync=False):
+        self.fmt = FORMATS[fmt]() if isinstance(fmt, str) else fmt
+        self.dtype = np.dtype(self.fmt.dtype)
+        self.itemsize = self.dtype.itemsize
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.date_time = date_time
+        self.check = check
+        self.framer = Framer(self.fmt, check=check) if resync else None
+        self.buffer = np.zeros(batch_size * self.itemsize, dtype=np.uint8)
+        self.fill = 0
+        self.state = None
+        self.timer = None
+        self.subscribers = []
+        self.stats = LiveStats()
+
+    def subscribe(self, callback):
+        '''callback(converted array) is called with every batch, returns the callback so it can be a decorator'''
+        self.subscribers.append(callback)
+        return callback
+
+    def feed_datagram(self, data):
+        '''one datagram holds whole telegrams, datagrams of an other length are dropped'''
+        self.stats.packets += 1
+        if len(data) % self.itemsize:
+            self.stats.dropped_packets += 1
+            self.stats.dropped_bytes += len(data)
+            return
+        self.feed(data)
+
+    def feed(self, data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        self.stats.bytes += len(data)
+        while len(data):
+            if self.fill == 0:
+                self.start_timer()
+            count = min(len(self.buffer) - self.fill, len(data))
+            self.buffer[self.fill:self.fill + count] = data[:count]
+            self.fill += count
+            data = data[count:]
+            if self.fill == len(self.buffer):
+                self.flush()
+
+    def start_timer(self):
+        if self.max_latency is None or self.timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # fed outside of an event loop, batches go out when full or on flush
+        self.timer = loop.call_later(self.max_latency, self.flush)
+
+    def flush(self):
+        '''convert what is in the buffer now and deliver it, a partial telegram is kept for the next batch'''
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        data = self.buffer[:self.fill]
+        if self.framer is not None:
+            records, frame_stats = self.framer.frame(data)
+            self.stats.rejected += frame_stats.rejected
+            # bytes that could still be the start of a telegram are kept
+            end = max(frame_stats.end, self.fill - self.itemsize + 1)
+            self.stats.dropped_bytes += frame_stats.skipped_bytes - (self.fill - end)
+        else:
+            end = self.fill - self.fill % self.itemsize
+            records = data[:end].view(self.dtype)
+            if self.check and len(records):
+                valid = self.fmt.validate(records)
+                if not valid.all():
+                    self.stats.rejected += int(len(valid) - np.count_nonzero(valid))
+                    records = records[valid]
+        converted_array = self.fmt.convert_array(records)
+        rest = self.fill - end
+        self.buffer[:rest] = self.buffer[end:self.fill]
+        self.fill = rest
+        if rest:
+            self.start_timer()
+        if not len(converted_array):
+            return None
+        if self.date_time is not None and hasattr(self.fmt, 'make_time'):
+            self.state = self.fmt.make_time(converted_array, self.date_time, self.state)
+        self.stats.records += len(converted_array)
+        self.stats.batches += 1
+        for callback in self.subscribers:
+            callback(converted_array)
+        return converted_array
+
+    def close(self):
+        self.flush()
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+
+class TelegramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    def datagram_received(self, data, addr):
+        self.batcher.feed_datagram(data)
+
+
+async def listen_udp(batcher, port, host='0.0.0.0'):
+    '''
+    start receiving telegrams on a udp port, many sensors can be received on one event loop.
+    :return: the transport, close it to stop
+    '''
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: TelegramProtocol(batcher), local_addr=(host, port))
+    return transport
+
+
+async def read_stream(batcher, reader, read_size=2**12):
+    '''feed a batcher from an asyncio StreamReader (tcp or serial) until the stream ends'''
+    while True:
+        data = await reader.read(read_size)
+        if not data:
+            break
+        batcher.feed(data)
+    batcher.close()
+
+
+async def read_serial(batcher, port, baudrate=115200, read_size=2**12):
+    '''serial port through pyserial-asyncio, the telegrams are framed by their sync header'''
+    try:
+        import serial_asyncio
+    except ImportError:
+        raise ImportError('reading a serial port needs pyserial-asyncio')
+    reader, _ = await serial_asyncio.open_serial_connection(url=port, baudrate=baudrate)
+    if batcher.framer is None:
+        batcher.framer = Framer(batcher.fmt, check=batcher.check)
+    await read_stream(batcher, reader, read_size)
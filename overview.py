@@ -0,0 +1,304 @@
+import datetime
+import json
+import math
+import os
+import numpy as np
+from binary_formats.formats import FORMATS, BinaryAbc
+from binary_formats.reader import ReadBinFIle
+from binary_formats.schema import VERSION
+
+META = 'meta.json'
+
+
+def overview_path(filename):
+    '''the overview of a file is kept in a directory next to it'''
+    return filename + '.overview'
+
+
+def column_names(array):
+    return list(array) if isinstance(array, dict) else list(array.dtype.names)
+
+
+def numeric_names(array, time_field='utc_time'):
+    '''the columns that can be decimated, all numeric columns but the time'''
+    return [name for name in column_names(array) if name != time_field and array[name].dtype.kind in 'iuf']
+
+
+def bin_dtype(array, names):
+    '''
+    one row pr. bin: time of the first and the last sample, number of samples and min, max and mean of every column.
+    min and max keep the type of the column, the mean is float64.
+    '''
+    dtype = [('start', '<f8'), ('end', '<f8'), ('count', '<i8')]
+    for name in names:
+        kind = array[name].dtype.newbyteorder('=')
+        dtype.append((name, [('min', kind), ('max', kind), ('mean', '<f8')]))
+    return np.dtype(dtype)
+
+
+def sample_bins(array, names, dtype, size, time_field='utc_time'):
+    '''
+    bins of size samples of a converted array (or dict of columns), the last bin gets the samples that are left.
+    min and max skip NaN.
+    '''
+    count = len(array[time_field])
+    first = np.arange(0, count, size)
+    bins = np.empty(len(first), dtype=dtype)
+    if not len(first):
+        return bins
+    time = array[time_field]
+    bins['start'] = time[first]
+    bins['end'] = time[np.append(first[1:], count) - 1]
+    bins['count'] = np.diff(np.append(first, count))
+    for name in names:
+        # a native contiguous copy of the column reduces about twice as fast as a strided record field
+        values = np.ascontiguousarray(array[name], dtype=array[name].dtype.newbyteorder('='))
+        column = bins[name]
+        column['min'] = np.fmin.reduceat(values, first)
+        column['max'] = np.fmax.reduceat(values, first)
+        column['mean'] = np.add.reduceat(values, first, dtype=np.float64) / bins['count']
+    return bins
+
+
+def merge_bins(bins, names, factor):
+    '''the next level of the pyramid, factor bins of a level make one bin'''
+    first = np.arange(0, len(bins), factor)
+    merged = np.empty(len(first), dtype=bins.dtype)
+    if not len(first):
+        return merged
+    counts = bins['count']
+    merged['start'] = bins['start'][first]
+    merged['end'] = bins['end'][np.append(first[1:], len(bins)) - 1]
+    merged['count'] = np.add.reduceat(counts, first)
+    for name in names:
+        column, out = bins[name], merged[name]
+        out['min'] = np.fmin.reduceat(column['min'], first)
+        out['max'] = np.fmax.reduceat(column['max'], first)
+        # the mean of a level is weighted by the samples in each bin, the last bin of a level can be short
+        out['mean'] = np.add.reduceat(column['mean'] * counts, first) / merged['count']
+    return merged
+
+
+def decimate(array, npoints, fields=None, time_field='utc_time'):
+    '''
+    min, max and mean of a converted array in at most npoints bins, done on the fly without an overview
+    :param fields: columns to decimate, all numeric columns if None
+    '''
+    names = list(fields) if fields is not None else numeric_names(array, time_field)
+    size = max(1, int(math.ceil(len(array[time_field]) / float(npoints))))
+    return sample_bins(array, names, bin_dtype(array, names), size, time_field)
+
+
+class OverviewBuilder(object):
+    '''
+    builds the levels of an overview from converted chunks (ReadBinFIle.iter_chunks), only the finest level and less
+    than one bin of samples are kept while streaming. level 0 has base samples pr. bin and every level above it
+    factor times more, up to the first level with at most top bins.
+    '''
+    def __init__(self, fields=None, time_field='utc_time', base=64, factor=8, top=1024):
+        self.fields = None if fields is None else list(fields)
+        self.time_field = time_field
+        self.base = base
+        self.factor = factor
+        self.top = top
+        self.names = None
+        self.dtype = None
+        self.chunks = []
+        self.carry = None  # samples of the bin that is not full yet
+
+    def update(self, array):
+        names = column_names(array)
+        if self.time_field not in names:
+            raise ValueError('no %s column, an overview needs time stamps' % self.time_field)
+        if self.names is None:
+            self.names = self.fields if self.fields is not None else numeric_names(array, self.time_field)
+            self.dtype = bin_dtype(array, self.names)
+        keep = [self.time_field] + self.names
+        count = len(array[self.time_field])
+        used = 0
+        if self.carry is not None:
+            used = min(self.base - len(self.carry[self.time_field]), count)
+            self.carry = dict((name, np.concatenate((self.carry[name], array[name][:used]))) for name in keep)
+            if len(self.carry[self.time_field]) < self.base:
+                return
+            self.chunks.append(sample_bins(self.carry, self.names, self.dtype, self.base, self.time_field))
+            self.carry = None
+        full = used + (count - used) // self.base * self.base
+        if full > used:
+            columns = dict((name, array[name][used:full]) for name in keep)
+            self.chunks.append(sample_bins(columns, self.names, self.dtype, self.base, self.time_field))
+        if full < count:
+            self.carry = dict((name, np.array(array[name][full:])) for name in keep)
+
+    def finish(self, meta=None):
+        if self.carry is not None:
+            self.chunks.append(sample_bins(self.carry, self.names, self.dtype, self.base, self.time_field))
+            self.carry = None
+        if self.dtype is None:
+            raise ValueError('no records, an overview needs at least one chunk')
+        levels = [np.concatenate(self.chunks)]
+        self.chunks = []
+        while len(levels[-1]) > self.top:
+            levels.append(merge_bins(levels[-1], self.names, self.factor))
+        return Overview(levels, self.base, self.factor, meta)
+
+
+class Overview(object):
+    '''
+    multi resolution min / max / mean of the columns of a file. level i has base * factor**i samples pr. bin.
+    meta holds the source file and how it was read, so query can fall back to the full resolution records.
+    '''
+    def __init__(self, levels, base, factor, meta=None):
+        self.levels = levels
+        self.base = base
+        self.factor = factor
+        self.meta = meta or {}
+
+    @property
+    def names(self):
+        return [name for name in self.levels[0].dtype.names if name not in ('start', 'end', 'count')]
+
+    def samples(self, level):
+        return self.base * self.factor**level
+
+    def bounds(self, level, start=None, end=None):
+        '''first and last (not included) bin of a level that overlap start to end'''
+        bins = self.levels[level]
+        first = 0 if start is None else int(np.searchsorted(bins['end'], start, 'left'))
+        last = len(bins) if end is None else int(np.searchsorted(bins['start'], end, 'right'))
+        return first, max(first, last)
+
+    def query(self, start=None, end=None, npoints=2000):
+        '''
+        the time range start to end (epoch floats, seconds of the week for SBET) at no more than npoints points.
+        the finest level with at most npoints bins in the range is used, when the range has no more than npoints
+        samples the converted records are read from the source file instead, if the range can be read without
+        converting the whole file (see pushdown).
+        :return: (samples pr. point, array). samples pr. point 1 is the converted records of the range with the
+        columns of the overview, else the bins of the level.
+        '''
+        first, last = self.bounds(0, start, end)
+        samples = int(self.levels[0]['count'][first:last].sum())
+        if samples <= npoints and self.meta.get('source') and self.pushdown():
+            return 1, self.full_resolution(start, end)
+        for level in range(len(self.levels)):
+            first, last = self.bounds(level, start, end)
+            if last - first <= npoints or level == len(self.levels) - 1:
+                return self.samples(level), np.array(self.levels[level][first:last])
+
+    def pushdown(self):
+        '''
+        true when the records of a time range are read without converting the whole source, the format has time
+        stamps or the times follow from the record number (EM3000 with an interval). not for VMM_MRU_Binary.
+        '''
+        fmt = FORMATS[self.meta['format']]()
+        date_time = reader_date_time(self.meta.get('date_time'))
+        return fmt.time_field is not None or fmt.time_slice(0, date_time) is not None
+
+    def full_resolution(self, start=None, end=None):
+        meta = self.meta
+        reader = ReadBinFIle(meta['source'], meta['format'], date_time=reader_date_time(meta.get('date_time')),
+                             start=start, end=end,
+                             fields=[meta['time_field']] + self.names)
+        return reader.run()[reader.dformat]
+
+    def save(self, path):
+        '''one .npy file pr. level and a json meta file, which is written last'''
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        meta_path = os.path.join(path, META)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for level, bins in enumerate(self.levels):
+            np.save(os.path.join(path, 'level_%02d.npy' % level), bins)
+        meta = dict(self.meta, base=self.base, factor=self.factor, levels=len(self.levels))
+        with open(meta_path + '.tmp', 'w') as fobj:
+            json.dump(meta, fobj, indent=1)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    @classmethod
+    def load(cls, path):
+        '''the levels are opened as read only memory maps, a query only reads the bins it returns'''
+        meta = read_meta(path)
+        levels = [np.load(os.path.join(path, 'level_%02d.npy' % level), mmap_mode='r')
+                  for level in range(meta['levels'])]
+        return cls(levels, meta['base'], meta['factor'], meta)
+
+
+def read_meta(path):
+    with open(os.path.join(path, META)) as fobj:
+        return json.load(fobj)
+
+
+def time_reference(date_time):
+    '''
+    date_time as [epoch of the first record, interval or None], which json keeps. date_time is a 7 tuple,
+    (start, interval) or start alone, where start is a datetime or an epoch float.
+    '''
+    if date_time is None:
+        return None
+    if isinstance(date_time, (datetime.datetime, int, float, np.number)):
+        return [BinaryAbc().epoch(date_time), None]
+    if len(date_time) == 2:
+        return [BinaryAbc().epoch(date_time[0]), float(date_time[1])]
+    return [BinaryAbc().epoch(date_time), float(date_time[6]) if len(date_time) > 6 else None]
+
+
+def reader_date_time(reference):
+    '''the date_time for ReadBinFIle of a time reference'''
+    if reference is None:
+        return None
+    start, interval = reference
+    return start if interval is None else (start, interval)
+
+
+def source_state(filename, dformat, date_time, fields, base, factor, top):
+    '''everything that changes the overview of a file, an overview with an other state is rebuilt'''
+    stat = os.stat(filename)
+    return {'source': os.path.abspath(filename), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'format': dformat, 'schema_version': VERSION, 'date_time': time_reference(date_time),
+            'fields': None if fields is None else list(fields), 'base': base, 'factor': factor, 'top': top}
+
+
+def fresh(meta, state):
+    return all(meta.get(key) == value for key, value in state.items() if not (key == 'format' and value == 'Auto'))
+
+
+def build_overview(filename, dformat='Auto', date_time=None, fields=None, base=64, factor=8, top=1024,
+                   chunk_size=2**18, **reader_args):
+    '''
+    overview of a file, streamed through ReadBinFIle.iter_chunks so memory is bounded by the chunk size and the
+    finest level. formats without time stamps (EM3000, VMM_MRU_Binary) need date_time.
+    '''
+    state = source_state(filename, dformat, date_time, fields, base, factor, top)
+    # read with the same date_time as query reads the full resolution records with
+    reader = ReadBinFIle(filename, dformat, date_time=reader_date_time(state['date_time']), chunk_size=chunk_size,
+                         **reader_args)
+    reader.set_format()
+    if reader.fmt.time_field is None and date_time is None:
+        raise ValueError('%s has no time stamps, give date_time to build an overview' % reader.dformat)
+    builder = OverviewBuilder(fields, base=base, factor=factor, top=top)
+    for chunk in reader.iter_chunks():
+        builder.update(chunk)
+    state['format'] = reader.dformat
+    state['time_field'] = builder.time_field
+    return builder.finish(state)
+
+
+def load_overview(filename, dformat='Auto', date_time=None, fields=None, path=None, base=64, factor=8, top=1024,
+                  rebuild=False, **reader_args):
+    '''
+    the overview of a file from its overview directory (next to the file unless path is given), built and saved
+    first when it is missing or the file, format or arguments changed.
+    '''
+    path = path or overview_path(filename)
+    if not rebuild:
+        try:
+            meta = read_meta(path)
+        except (IOError, OSError, ValueError):
+            meta = None
+        if meta is not None and fresh(meta, source_state(filename, dformat, date_time, fields, base, factor, top)):
+            return Overview.load(path)
+    overview = build_overview(filename, dformat, date_time, fields, base, factor, top, **reader_args)
+    overview.save(path)
+    return overview
@@ -0,0 +1,218 @@
+import numpy as np
+
+GAP, DUPLICATE, BACKWARDS, REDUCED, INVALID, SPIKE = range(1, 7)
+CODES = {GAP: 'gap', DUPLICATE: 'duplicate', BACKWARDS: 'backwards', REDUCED: 'reduced', INVALID: 'invalid',
+         SPIKE: 'spike'}
+# one row pr. event, the samples start to end (not included) of field, time events have the time field as field
+EVENT_DTYPE = [('start', '<i8'), ('end', '<i8'), ('code', 'u1'), ('field', 'U32')]
+SPIKE_FIELDS = ['roll', 'pitch', 'heave', 'Roll', 'Pitch', 'Heave']
+# the spike check waits for at least this many samples to estimate the robust standard deviation from, so small
+# chunks find the same spikes as the whole array
+SIGMA_SAMPLES = 1000
+
+
+def runs(index, values=None):
+    '''
+    runs of consecutive sample indexes, with the same value when values are given. only the flagged samples are
+    handled here, so the cost is in the one np.flatnonzero over the chunk that found them.
+    :return: start, end (not included) and value of every run
+    '''
+    if not len(index):
+        return index, index, values
+    new = np.diff(index) != 1
+    if values is not None:
+        new |= np.diff(values) != 0
+    first = np.flatnonzero(np.concatenate(([True], new)))
+    last = np.concatenate((first[1:], [len(index)])) - 1
+    return index[first], index[last] + 1, None if values is None else values[first]
+
+
+def make_events(starts, ends, code, field):
+    events = np.empty(len(starts), dtype=EVENT_DTYPE)
+    events['start'] = starts
+    events['end'] = ends
+    events['code'] = code
+    events['field'] = field
+    return events
+
+
+def merge_events(events):
+    '''join the events of the same code and field that overlap or touch, ie. a run split between two chunks'''
+    if len(events) < 2:
+        return events
+    events = events[np.lexsort((events['start'], events['code'], events['field']))]
+    same = (events['field'][1:] == events['field'][:-1]) & (events['code'][1:] == events['code'][:-1])
+    # the furthest end so far within each group, groups are shifted apart so the maximum does not carry over
+    shift = np.concatenate(([0], np.cumsum(~same))) * (int(events['end'].max()) + 1)
+    reach = np.maximum.accumulate(events['end'] + shift)
+    new = np.concatenate(([True], ~same | (events['start'][1:] + shift[1:] > reach[:-1])))
+    first = np.flatnonzero(new)
+    merged = events[first]
+    merged['end'] = np.maximum.reduceat(events['end'], first)
+    return merged[np.argsort(merged['start'], kind='stable')]
+
+
+def status_fields(fmt):
+    '''columns with a decoded status, 0 ok, 1 reduced and 2 invalid (Kmbinary status bits, EM3000 status)'''
+    return [field.name for field in (fmt.fields or []) if field.bits is not None or field.lut is not None]
+
+
+def column_names(array):
+    return list(array) if isinstance(array, dict) else list(array.dtype.names)
+
+
+class QCReport(object):
+    def __init__(self, events, summary):
+        self.events = events
+        self.summary = summary
+
+    def event_names(self):
+        return [CODES[code] for code in self.events['code']]
+
+    def __repr__(self):
+        return 'QCReport(%d records, %s)' % (self.summary['records'], ', '.join(
+            '%s=%d' % (CODES[code], self.summary['events'].get(CODES[code], 0)) for code in sorted(CODES)))
+
+
+class QualityControl(object):
+    '''
+    quality control of converted arrays in one vectorized pass, the whole array at once or chunk by chunk with update
+    and finish. the events are ranges of sample indexes with a reason code:
+    gap - time step longer than gap_factor times the nominal interval (interval, or the median step of the first
+    chunk), duplicate - same time stamp twice, backwards - time stepping back, reduced / invalid - status columns of
+    the format (schema fields with status bits or a status lut), spike - attitude samples where the second
+    difference is more than spike_sigma robust standard deviations.
+    '''
+    def __init__(self, fmt=None, time_field='utc_time', interval=None, gap_factor=2.5, status=None,
+                 spikes=SPIKE_FIELDS, spike_sigma=10.0, check_time=True):
+        self.time_field = time_field
+        self.interval = interval
+        self.gap_factor = gap_factor
+        self.status = status if status is not None else (status_fields(fmt) if fmt is not None else [])
+        self.spikes = spikes
+        self.spike_sigma = spike_sigma
+        self.check_time = check_time
+        self.records = 0
+        self.first_time = None
+        self.last_time = None
+        self.gap_seconds = 0.0
+        self.largest_gap = 0.0
+        self.degraded = {}
+        self.sigma = {}
+        self.tails = {}
+        self.events = []
+
+    def update(self, array):
+        '''
+        check the next chunk
+        :return: the events found in it, indexes counted from the start of the first chunk
+        '''
+        names = column_names(array)
+        count = len(array[names[0]]) if names else 0
+        events = []
+        if self.check_time and self.time_field in names and count:
+            events += self.check_times(np.asarray(array[self.time_field], dtype=np.float64))
+        for name in self.status:
+            if name in names:
+                events += self.check_status(name, array[name])
+        for name in self.spikes:
+            if name in names and count:
+                values = array[name]
+                kind = values.dtype if values.dtype.kind == 'f' else np.dtype(np.float64)
+                events += self.check_spikes(name, np.ascontiguousarray(values, dtype=kind.newbyteorder('=')))
+        self.records += count
+        events = np.concatenate(events) if events else np.zeros(0, dtype=EVENT_DTYPE)
+        self.events.append(events)
+        return events
+
+    def check_times(self, time):
+        if self.first_time is None:
+            self.first_time = float(time[0])
+        if self.last_time is None:
+            step = np.diff(time)
+            first = self.records
+        else:
+            # the step from the last sample of the previous chunk
+            step = np.diff(time, prepend=self.last_time)
+            first = self.records - 1
+        self.last_time = float(time[-1])
+        if self.interval is None:
+            positive = step[step > 0]
+            if not len(positive):
+                return []
+            self.interval = float(np.median(positive))
+        index = np.flatnonzero((step > self.gap_factor * self.interval) | (step <= 0))
+        if not len(index):
+            return []
+        flagged = step[index]
+        codes = np.where(flagged > 0, GAP, np.where(flagged == 0, DUPLICATE, BACKWARDS)).astype(np.uint8)
+        gaps = flagged[codes == GAP]
+        if len(gaps):
+            self.gap_seconds += float((gaps - self.interval).sum())
+            self.largest_gap = max(self.largest_gap, float(gaps.max()))
+        starts, ends, codes = runs(index, codes)
+        # a step involves the sample before and the sample after it
+        return [make_events(starts + first, ends + first + 1, codes, self.time_field)]
+
+    def check_status(self, name, values):
+        index = np.flatnonzero(values)  # 0 is ok
+        if not len(index):
+            return []
+        flagged = values[index]
+        for code, value in ((REDUCED, 1), (INVALID, 2)):
+            key = (CODES[code], name)
+            self.degraded[key] = self.degraded.get(key, 0) + int(np.count_nonzero(flagged == value))
+        starts, ends, flagged = runs(index, flagged)
+        codes = np.where(flagged == 1, REDUCED, INVALID).astype(np.uint8)
+        return [make_events(starts + self.records, ends + self.records, codes, name)]
+
+    def check_spikes(self, name, values, final=False):
+        tail = self.tails.get(name, values[:0])
+        values = np.concatenate((tail, values)) if len(tail) else values
+        if name not in self.sigma and len(values) < SIGMA_SAMPLES and not final:
+            # checked with the next chunk
+            self.tails[name] = values
+            return []
+        self.tails[name] = values[-2:]
+        if len(values) < 3:
+            return []
+        second = values[2:] - values[1:-1]
+        second -= values[1:-1]
+        second += values[:-2]
+        np.abs(second, out=second)
+        if name not in self.sigma:
+            # robust standard deviation from the median absolute deviation of at most 10**5 samples. most second
+            # differences of quantized values (EM3000 in 0.01 degrees) are zero, the median absolute deviation then
+            # says nothing and a quarter of the standard deviation is the floor
+            sample = second[::max(1, len(second) // 10**5)].astype(np.float64)
+            sigma = 1.4826 * float(np.median(np.abs(sample - np.median(sample))))
+            self.sigma[name] = max(sigma, 0.25 * float(sample.std()), 1e-12)
+        index = np.flatnonzero(second > self.spike_sigma * self.sigma[name])
+        if not len(index):
+            return []
+        starts, ends, _ = runs(index)
+        # second[i] is centred on sample i + 1 of values, which starts len(tail) samples before this chunk
+        first = self.records - len(tail) + 1
+        return [make_events(starts + first, ends + first, SPIKE, name)]
+
+    def finish(self):
+        for name, tail in self.tails.items():
+            if name not in self.sigma:
+                events = self.check_spikes(name, tail[:0], final=True)
+                self.events.append(np.concatenate(events) if events else np.zeros(0, dtype=EVENT_DTYPE))
+        events = merge_events(np.concatenate(self.events)) if self.events else np.zeros(0, dtype=EVENT_DTYPE)
+        counts = np.bincount(events['code'], minlength=len(CODES) + 1)
+        summary = {'records': self.records, 'first_time': self.first_time, 'last_time': self.last_time,
+                   'interval': self.interval, 'gap_seconds': self.gap_seconds, 'largest_gap': self.largest_gap,
+                   'events': dict((CODES[code], int(counts[code])) for code in CODES),
+                   'degraded_samples': dict(('%s %s' % key, samples) for key, samples in self.degraded.items()),
+                   'spikes': dict((name, int(np.count_nonzero((events['code'] == SPIKE) & (events['field'] == name))))
+                                  for name in self.sigma)}
+        return QCReport(events, summary)
+
+
+def run_qc(array, fmt=None, **kwargs):
+    '''quality control of a whole converted array (or dict of columns), returns a QCReport'''
+    qc = QualityControl(fmt, **kwargs)
+    qc.update(array)
+    return qc.finish()
@@ -1,5 +1,9 @@
-from binary_formats.formats import EM3000, SeapathBin26, VmmMruBin, Kmbinary, SeapathBin11, sbet
+from binary_formats.formats import FORMATS
+from binary_formats.framing import FrameStats, block_end
+from binary_formats.stats import LoadStats, count_records, new_bytes
 import numpy as np
+import os
+import time
 
 
 class fakeprogressbar(object):
@@ -15,97 +19,413 @@ class fakeprogressbar(object):
 
 
 class DetectFormat(object):
-    def __init__(self, data, mode='File'):
+    '''
+    finds the format of a file, or of a string of datagrams when mode is not 'File', from one small block.
+    every format is scored by the share of the block that is valid telegrams (sync, checksum, status or
+    plausibility checks by its own validate), found by the framer for the formats with a sync and by the length
+    linked header chain for the container formats (KMBIN), where records of other types count as well. formats
+    without a sync are tried on the record grid from every start offset, they have nothing to confirm the record
+    size and are weighted down.
+    '''
+    def __init__(self, data, mode='File', formats=None, block_size=2**16, threshold=0.5):
         self.mode = mode
         self.data = data
-        self.index = 0
-        self.read_lines = 10  # number of binary telegrams to read an compeare to be sure that the right format is found
-        self.map = {'EM3000': self.em3000, 'Seapath_bin26': self.Seapath_bin26,
-                    'KMBIN': self.km_binary()}
+        self.formats = formats if formats is not None else dict((name, cls()) for name, cls in FORMATS.items())
+        self.block_size = block_size
+        self.threshold = threshold
+        self.no_sync_weight = 0.9
+        self.scores = {}
 
     def run(self):
-        name = None
-        func = None
-        for name, func in self.map.items():
-            if func():
-                break
-        if name is None:
+        return self.detect()[0]
+
+    def detect(self):
+        '''
+        :return: name of the best matching format and the confidence of the match, 0 to 1
+        '''
+        block = np.frombuffer(self.read_block(), dtype=np.uint8)
+        self.scores = dict((name, self.score(fmt, block)) for name, fmt in self.formats.items())
+        name = max(self.scores, key=self.scores.get) if self.scores else None
+        if name is None or self.scores[name] < self.threshold:
             raise TypeError('No format found, specify format manualy!')
-        return name
-
-    def read_file(self, len):
-        with open(self.data, 'rb') as fobj:
-            self.data = fobj.read(len)
-        return
-
-    def iter(self, len):
-        data = self.data[self.index:self.index+len]
-        self.index = self.index+len
-        if len(data) < len:
-            data = None
-        return data
+        return name, self.scores[name]
 
-    def em3000(self):
-        # TODO: add check for status before returning true. status can only be 144, 145 or 160.
-        fmt = EM3000()    # init the format in question
-        data_length = 10  # nbytes to read pr datagram acording to format spesification
-        if self.mode == 'File':  # aquire datagrams in stead of file path
-            self.read_file(10*self.read_lines)
-        else:
-            if not len(self.data) == data_length*self.read_lines:  # if the user has read datagrams and not provided corect amount. avioding numpy ValueError: string size must be a multiple of element size
-                raise ValueError('binary string length is wrong')
-        array = fmt.read_line(self.data)
-        if np.all(array['status'] == 144):  # EM3000 has only header that is definetive to check aganist.
-            return True
+    def read_block(self):
+        if self.mode == 'File':
+            with open(self.data, 'rb') as fobj:
+                return fobj.read(self.block_size)
+        return bytes(self.data[:self.block_size])
 
-    def Seapath_bin26(self):
-        pass
-
-    def km_binary(self):
-        pass
+    def score(self, fmt, block):
+        dtype = np.dtype(fmt.dtype)
+        size = dtype.itemsize
+        if len(block) < 2 * size:
+            return 0.0
+        if fmt.sync_pattern():
+            # the share of the block that the format explains with valid records, a lost byte only costs the
+            # record it was in. formats without a checksum also need the records to look like a log
+            records, stats = fmt.frame(block)
+            if not len(records):
+                return 0.0
+            return float(stats.total_bytes - stats.skipped_bytes) / len(block) * fmt.evidence(records)
+        best = 0.0
+        for offset in range(size):
+            count = (len(block) - offset) // size
+            records = block[offset:offset + count * size].view(dtype)
+            valid = fmt.validate(records)
+            if not valid.any():
+                continue
+            # bytes in front of the first record are not explained by the format
+            coverage = (len(block) - offset) / float(len(block))
+            share = np.count_nonzero(valid) / float(count) * fmt.evidence(records[valid])
+            best = max(best, self.no_sync_weight * coverage * share)
+        return float(best)
 
 
 class ReadBinFIle(object):
-    def __init__(self, filename, dformat='Auto', progresbar=fakeprogressbar(), date_time=None, verbose=False):
-        self.formats = {'EM3000': EM3000(), 'Seapath_bin26': SeapathBin26(),
-                        'VMM_MRU_Binary': VmmMruBin(), 'KMBIN': Kmbinary()}
+    '''
+    :param fields: names of the columns to return, all if None. only these columns are converted.
+    :param start: first time to return, epoch float (seconds of the week for SBET), datetime or date_time tuple
+    :param end: last time to return, records with start <= utc_time <= end are returned.
+    formats with a time stamp in the record are bisected on the memory mapped file, so only the window is read and
+    converted. EM3000 and VMM_MRU_Binary only get a time from make_time. EM3000 with an interval is sliced by
+    fmt.time_slice, VMM_MRU_Binary is converted whole and then masked.
+    :param resync: find the records by their sync and checksum (framing.Framer), so lost or inserted bytes only cost
+    the damaged records. every record is checked, this is several times slower than the plain read of a clean file.
+    '''
+    def __init__(self, filename, dformat='Auto', progresbar=fakeprogressbar(), date_time=None, verbose=False,
+                 chunk_size=2**18, resync=False, cache=None, fields=None, start=None, end=None, zero_copy=False,
+                 profile=False, callbacks=None, trace_memory=False, qc=False):
+        self.formats = {}  # format instances, made when they are needed
         self.fmt = None
         self.dformat = dformat
+        self.confidence = None
         self.filename = filename
         self.progess = progresbar
         self.date_time = date_time
+        self.chunk_size = chunk_size
+        self.resync = resync
+        self.frame_stats = None
+        self.time_state = None  # make_time state at the first record of a window sliced by fmt.time_slice
+        if isinstance(cache, str):
+            from binary_formats.cache import ArrayCache
+            cache = ArrayCache(cache)
+        self.cache = cache
+        self.fields = None if fields is None else list(fields)
+        self.start = start
+        self.end = end
+        self.zero_copy = zero_copy
+        self.verbose = verbose
+        self.callbacks = list(callbacks or [])
+        self.trace_memory = trace_memory
+        self.stats = LoadStats() if profile or verbose or self.callbacks or trace_memory else None
+        self.detect_bytes = 0
+        self.qc = qc
+        self.qc_report = None
         self.progess.setRange(0, 6)
 
     def run(self):
+        tracing = self.start_tracing()
         self.progess.setValue(1)
-        self.set_format()
+        self.timed('set_format', self.set_format)
         self.progess.setValue(2)
-        raw_array = self.parse_bin()
-        self.progess.setValue(3)
-        converted_array = self.convert(raw_array)
-        self.progess.setValue(4)
-        self.make_time(converted_array)
+        converted_array = self.timed('load_cache', self.load_cache)
+        if converted_array is None:
+            raw_array = self.timed('window', self.window, self.timed('parse_bin', self.parse_bin))
+            self.progess.setValue(3)
+            converted_array = self.timed('convert', self.convert, raw_array)
+            self.progess.setValue(4)
+            self.timed('make_time', self.make_time, converted_array)
+            converted_array = self.timed('select', self.select, converted_array)
+            self.timed('store_cache', self.store_cache, converted_array)
+        if self.qc:
+            quality_control = self.quality_control()
+            self.timed('qc', quality_control.update, converted_array)
+            self.qc_report = quality_control.finish()
         self.progess.setValue(5)
-        packed = self.dict_packing(converted_array)
+        packed = self.timed('dict_packing', self.dict_packing, converted_array)
         self.progess.setValue(6)
+        self.stop_tracing(tracing)
         return packed
 
+    def iter_chunks(self, chunk_size=None):
+        '''
+        streaming version of run, the file is memory mapped and converted arrays of at most chunk_size records are
+        yielded one at the time. with resync and for container formats the file is framed block by block.
+        concatenating the chunks gives the same array as run.
+        '''
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        tracing = self.start_tracing()
+        self.timed('set_format', self.set_format)
+        if self.framed_read():
+            self.progess.setRange(0, os.path.getsize(self.filename) // np.dtype(self.fmt.dtype).itemsize)
+            raw_chunks = self.frame_blocks(chunk_size)
+        else:
+            raw_array = self.timed('window', self.window, self.timed('parse_bin', self.fmt.memmap_file, self.filename))
+            self.progess.setRange(0, len(raw_array))
+            raw_chunks = (raw_array[start:start + chunk_size] for start in range(0, len(raw_array), chunk_size))
+        quality_control = self.quality_control() if self.qc else None
+        state = None
+        done = 0
+        for raw_chunk in raw_chunks:
+            converted_array = self.timed('convert', self.convert, raw_chunk)
+            state = self.timed('make_time', self.make_time, converted_array, state)
+            done += len(raw_chunk)
+            self.progess.setValue(done)
+            converted_array = self.timed('select', self.select, converted_array)
+            if quality_control is not None:
+                self.timed('qc', quality_control.update, converted_array)
+            yield converted_array
+        if quality_control is not None:
+            self.qc_report = quality_control.finish()
+        self.stop_tracing(tracing)
+
+    def frame_blocks(self, chunk_size):
+        '''
+        raw records of the file found by fmt.frame (resync, container formats), framed in blocks of the bytes of
+        chunk_size records so memory is bounded by the chunk size. the window is applied to every block, the records
+        are yielded in chunks of at most chunk_size.
+        '''
+        data = self.raw_bytes()
+        self.frame_stats = FrameStats()
+        self.frame_stats.total_bytes = len(data)
+        # a block holds at least two records of the longest length, so every block moves on
+        block_size = max(chunk_size * np.dtype(self.fmt.dtype).itemsize, 2**17)
+        self.framed = 0
+        while self.framed < len(data):
+            records = self.timed('parse_bin', self.frame_block, data[self.framed:self.framed + block_size],
+                                 self.framed + block_size >= len(data))
+            records = self.timed('window', self.window, records)
+            for start in range(0, len(records), chunk_size):
+                yield records[start:start + chunk_size]
+
+    def frame_block(self, block, last):
+        '''records of one block of frame_blocks, self.framed is moved past the bytes that are done with'''
+        records, stats = self.fmt.frame(block)
+        self.framed += len(block) if last else block_end(self.fmt, stats, len(block))
+        self.frame_stats.add(stats)
+        return records
+
+    def quality_control(self):
+        from binary_formats.qc import QualityControl
+        # without date_time the formats that get their time from make_time have no time to check
+        check_time = self.fmt.time_field is not None or self.date_time is not None
+        return QualityControl(self.fmt, check_time=check_time, **(self.qc if isinstance(self.qc, dict) else {}))
+
+    def timed(self, name, func, *args):
+        '''
+        run one stage of the load, its stats are recorded when profiling is on. with profiling off this is only the
+        call and one test. stages that do nothing in this load are not recorded.
+        '''
+        if self.stats is None or not self.applies(name):
+            return func(*args)
+        if self.trace_memory:
+            import tracemalloc
+            traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        stage = self.stats.stage(name)
+        stage.calls += 1
+        stage.seconds += seconds
+        # stages that work in place, store or check an array are counted by the array they got
+        stage.records += count_records(args[0] if name in ('make_time', 'store_cache', 'qc') else result)
+        stage.allocated += new_bytes(result, args)
+        stage.bytes_read += self.bytes_read(name, args, result)
+        if self.trace_memory:
+            stage.peak_traced = max(stage.peak_traced, tracemalloc.get_traced_memory()[1] - traced)
+        for callback in self.callbacks:
+            callback(stage)
+        return result
+
+    def applies(self, name):
+        '''false for a stage that only passes its argument on with the arguments of this load'''
+        if name == 'make_time':
+            return self.date_time is not None and hasattr(self.fmt, 'make_time')
+        if name in ('load_cache', 'store_cache'):
+            return self.cache is not None and not self.zero_copy
+        if name == 'window':
+            return self.windowed()
+        if name == 'select':
+            return not self.pushdown()
+        return True
+
+    def bytes_read(self, name, args, result):
+        '''
+        bytes a stage read from the file. a memory map is not read when it is made, its pages are counted by the
+        stage that first touches them.
+        '''
+        if name == 'set_format':
+            return self.detect_bytes
+        if name in ('parse_bin', 'load_cache') and isinstance(result, np.ndarray) and not isinstance(result, np.memmap):
+            if name == 'parse_bin' and args:
+                # a block of the file framed by iter_chunks
+                return args[0].nbytes
+            if name == 'parse_bin' and self.frame_stats is not None:
+                return self.frame_stats.total_bytes
+            return result.nbytes
+        if name == 'window' and isinstance(args[0], np.memmap) and not isinstance(result, np.memmap):
+            # records out of order were masked away, the window is copied out of the map
+            return result.nbytes
+        if name == 'convert' and isinstance(args[0], np.memmap):
+            return args[0].nbytes
+        return 0
+
+    def start_tracing(self):
+        if self.trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                return True
+        return False
+
+    def stop_tracing(self, tracing):
+        if tracing:
+            import tracemalloc
+            tracemalloc.stop()
+        if self.verbose and self.stats is not None:
+            print('%s %s' % (self.filename, self.dformat))
+            print(self.stats.report())
+
     def set_format(self):
         if self.dformat == 'Auto':
-            self.dformat = DetectFormat(self.filename).run()
+            detector = DetectFormat(self.filename)
+            self.dformat, self.confidence = detector.detect()
+            self.detect_bytes = min(detector.block_size, os.path.getsize(self.filename))
+            self.formats.update(detector.formats)
+        if self.dformat not in self.formats:
+            self.formats[self.dformat] = FORMATS[self.dformat]()
         self.fmt = self.formats[self.dformat]
 
     def parse_bin(self):
+        if self.framed_read():
+            array, self.frame_stats = self.fmt.frame(self.raw_bytes())
+            return array
+        if self.windowed() or self.zero_copy:
+            # only the records that are used are paged in
+            return self.fmt.memmap_file(self.filename)
         return self.fmt.read_file(self.filename)
 
+    def framed_read(self):
+        '''true when the records are found in the raw bytes by fmt.frame instead of on the fixed record grid'''
+        return self.resync or self.fmt.container
+
+    def raw_bytes(self):
+        '''
+        the file as a memory mapped uint8 array. for container formats with a time window only the bytes of the
+        window, bisected by fmt.byte_window.
+        '''
+        if os.path.getsize(self.filename) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        data = np.memmap(self.filename, dtype=np.uint8, mode='r')
+        if self.fmt.container and self.windowed():
+            start = None if self.start is None else self.fmt.epoch(self.start)
+            end = None if self.end is None else self.fmt.epoch(self.end)
+            first, last = self.fmt.byte_window(data, start, end)
+            data = data[first:last]
+        return data
+
+    def windowed(self):
+        return self.start is not None or self.end is not None
+
+    def pushdown(self):
+        '''true when the window and the fields can be applied to the raw records before the conversion'''
+        return self.fmt.time_field is not None or (self.date_time is None and not self.windowed())
+
+    def window(self, raw_array):
+        '''
+        records of the time window, bisected on the raw time column. records out of order inside the window
+        are masked away.
+        '''
+        if not self.windowed():
+            return raw_array
+        if self.fmt.time_field is None:
+            return self.time_slice(raw_array)
+        start = None if self.start is None else self.fmt.epoch(self.start)
+        end = None if self.end is None else self.fmt.epoch(self.end)
+        first, last = self.fmt.time_window(raw_array, start, end)
+        raw_array = raw_array[first:last]
+        time = self.fmt.record_time(raw_array)
+        inside = np.ones(len(raw_array), dtype=bool)
+        if start is not None:
+            inside &= time >= start
+        if end is not None:
+            inside &= time <= end
+        if not inside.all():
+            raw_array = raw_array[inside]
+        return raw_array
+
+    def time_slice(self, raw_array):
+        '''
+        records of the time window for formats whose time is only known from make_time, when the times follow from
+        the record number (fmt.time_slice). the records found by framing are windowed after the conversion.
+        '''
+        if self.framed_read():
+            return raw_array
+        start = None if self.start is None else self.fmt.epoch(self.start)
+        end = None if self.end is None else self.fmt.epoch(self.end)
+        window = self.fmt.time_slice(len(raw_array), self.date_time, start, end)
+        if window is None:
+            return raw_array
+        first, last, self.time_state = window
+        return raw_array[first:last]
+
+    def select(self, array):
+        '''
+        time window and fields for the formats where they could not be pushed down to the raw records
+        '''
+        if self.pushdown():
+            return array
+        if self.windowed():
+            if self.date_time is None:
+                raise ValueError('%s has no time stamps, give date_time to select a time window' % self.dformat)
+            time = array['utc_time']
+            inside = np.ones(len(time), dtype=bool)
+            if self.start is not None:
+                inside &= time >= self.fmt.epoch(self.start)
+            if self.end is not None:
+                inside &= time <= self.fmt.epoch(self.end)
+            if isinstance(array, dict):
+                return dict((name, array[name][inside]) for name in self.fields or array)
+            array = array[inside]
+        if isinstance(array, dict):
+            return dict((name, array[name]) for name in self.fields or array)
+        if self.fields is not None:
+            selected = np.empty(len(array), dtype=[(name, array.dtype[name]) for name in self.fields])
+            for name in self.fields:
+                selected[name] = array[name]
+            array = selected
+        return array
+
     def convert(self, array):
+        fields = self.fields if self.pushdown() else None
+        if self.zero_copy:
+            return self.fmt.convert_columns(array, fields)
         if hasattr(self.fmt, 'convert_array'):
-            return self.fmt.convert_array(array)
+            return self.fmt.convert_array(array, fields)
         return array
 
-    def make_time(self, array):
+    def make_time(self, array, state=None):
         if hasattr(self.fmt, 'make_time') and self.date_time is not None:
-            return self.fmt.make_time(array, self.date_time)
+            return self.fmt.make_time(array, self.date_time, state or self.time_state)
+
+    def cache_key(self):
+        return self.cache.key(self.filename, self.dformat, repr(self.date_time), self.resync, self.fields,
+                              repr(self.start), repr(self.end))
+
+    def load_cache(self):
+        '''
+        converted array from the cache as a read only memory map, None when caching is off or there is no entry
+        '''
+        if self.cache is None or self.zero_copy:
+            return None
+        return self.cache.load(self.cache_key())
+
+    def store_cache(self, array):
+        if self.cache is not None and not self.zero_copy:
+            self.cache.store(self.cache_key(), array)
 
     def dict_packing(self, array):
         return {self.dformat: array}
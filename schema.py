@@ -0,0 +1,226 @@
+import numpy as np
+
+# bumped whenever a schema or transform changes the converted output, so stored conversions can be invalidated
+VERSION = 1
+
+
+def status_column(status, invalid, reduced):
+    '''
+    0 for ok, 1 when the reduced performance bit is set and 2 when the invalid data bit is set.
+    '''
+    one = np.uint32(1)
+    status = np.asarray(status, dtype=np.uint32)
+    invalid = (status >> np.uint32(invalid)) & one
+    return (invalid << one) | ((status >> np.uint32(reduced)) & (invalid ^ one))
+
+
+class Field(object):
+    '''
+    one column of a converted array, read from the raw field src (default the field of the same name).
+    transforms are applied in this order:
+    unit ('rad' for radians to degrees), func, scale, offset, then the raw field frac is added as a fraction of the
+    value, multiplied by frac_scale or divided by frac_div.
+    lut remaps integer codes, bits=(invalid bit, reduced bit) decodes a status word and value fills a constant.
+    '''
+    def __init__(self, name, dtype, src=None, unit=None, func=None, scale=None, offset=None, frac=None,
+                 frac_scale=None, frac_div=None, lut=None, bits=None, value=None):
+        self.name = name
+        self.dtype = dtype
+        self.src = name if src is None else src
+        self.unit = unit
+        self.func = func
+        self.scale = scale
+        self.offset = offset
+        self.frac = frac
+        self.frac_scale = frac_scale
+        self.frac_div = frac_div
+        self.lut = lut
+        self.bits = bits
+        self.value = value
+
+    @property
+    def sources(self):
+        '''raw fields this column is built from'''
+        if self.value is not None:
+            return []
+        if self.frac is not None:
+            return [self.src, self.frac]
+        return [self.src]
+
+    @property
+    def is_copy(self):
+        '''true when the column is the raw field unchanged apart from the type'''
+        return self.value is None and self.lut is None and self.bits is None and self.unit is None and \
+            self.func is None and self.scale is None and self.offset is None and self.frac is None
+
+    def compile(self):
+        '''
+        returns a function (raw array, output column) that writes the whole column once. the expressions are kept
+        the same as the hand written converters so the results are identical.
+        '''
+        src = self.src
+        if self.value is not None:
+            value = self.value
+
+            def step(array, out):
+                out[...] = value
+        elif self.lut is not None:
+            lut = np.arange(256, dtype=np.dtype(self.dtype).newbyteorder('='))
+            for old, new in self.lut.items():
+                lut[old] = new
+
+            def step(array, out):
+                out[...] = lut[array[src]]
+        elif self.bits is not None:
+            invalid, reduced = self.bits
+
+            def step(array, out):
+                out[...] = status_column(array[src], invalid, reduced)
+        elif self.is_copy:
+            def step(array, out):
+                out[...] = array[src]
+        else:
+            step = self.compile_arithmetic()
+        return step
+
+    def compile_arithmetic(self):
+        src = self.src
+        ops = []
+        if self.unit == 'rad':
+            ops.append(np.rad2deg)
+        elif self.unit is not None:
+            raise ValueError('unknown unit %s for %s' % (self.unit, self.name))
+        if self.func is not None:
+            ops.append(self.func)
+        if self.scale is not None:
+            scale = self.scale
+            ops.append(lambda value: value * scale)
+        if self.offset is not None:
+            offset = self.offset
+            ops.append(lambda value: value + offset)
+        frac, frac_scale, frac_div = self.frac, self.frac_scale, self.frac_div
+
+        if len(ops) == 1 and frac is None and self.scale is not None:
+            # the common case, scale straight into the output column without a temporary
+            def step(array, out):
+                np.multiply(array[src], scale, out=out, casting='unsafe')
+            return step
+        if ops == [np.rad2deg] and frac is None:
+            def step(array, out):
+                np.rad2deg(array[src], out=out, casting='unsafe')
+            return step
+
+        def step(array, out):
+            value = array[src]
+            for op in ops:
+                value = op(value)
+            if frac is not None:
+                if frac_div is not None:
+                    value = value + (array[frac] / frac_div)
+                else:
+                    value = value + (array[frac] * frac_scale)
+            out[...] = value
+        return step
+
+
+class Converter(object):
+    '''
+    converter compiled from a raw dtype and a list of Fields. every output column is written exactly once into an
+    uninitialised array. neighbouring columns that are plain copies with the same layout in the raw and the output
+    array are copied as one block of bytes. when the raw and output layout are identical the records are copied in
+    one go and only the transformed columns are rewritten in place.
+    '''
+    def __init__(self, raw_dtype, fields):
+        self.raw_dtype = np.dtype(raw_dtype)
+        self.fields = list(fields)
+        self.dtype = np.dtype([(field.name, field.dtype) for field in self.fields])
+        for field in self.fields:
+            for name in field.sources:
+                if name not in self.raw_dtype.names:
+                    raise ValueError('%s needs raw field %s which is not in the raw dtype' % (field.name, name))
+        self.column_steps = dict((field.name, field.compile()) for field in self.fields)
+        self.steps = []
+        if self.dtype == self.raw_dtype and not self.overlapping():
+            # same layout, copy the records in one go and transform the columns that need it in place
+            self.in_place = True
+            self.steps = [self.compile_field(field) for field in self.fields if not field.is_copy]
+            return
+        self.in_place = False
+        block = []
+        for field in self.fields:
+            if self.block_copy(field):
+                if block and not self.extends(block, field):
+                    self.steps.append(self.compile_block(block))
+                    block = []
+                block.append(field)
+                continue
+            if block:
+                self.steps.append(self.compile_block(block))
+                block = []
+            self.steps.append(self.compile_field(field))
+        if block:
+            self.steps.append(self.compile_block(block))
+
+    def overlapping(self):
+        '''true if a transformed column reads a raw field that another column overwrites'''
+        written = set(field.name for field in self.fields if not field.is_copy)
+        return any(source != field.name and source in written for field in self.fields for source in field.sources)
+
+    def block_copy(self, field):
+        return field.is_copy and self.raw_dtype.fields[field.src][0] == self.dtype.fields[field.name][0]
+
+    def extends(self, block, field):
+        last = block[-1]
+        raw_end = self.raw_dtype.fields[last.src][1] + self.raw_dtype.fields[last.src][0].itemsize
+        out_end = self.dtype.fields[last.name][1] + self.dtype.fields[last.name][0].itemsize
+        return self.raw_dtype.fields[field.src][1] == raw_end and self.dtype.fields[field.name][1] == out_end
+
+    def compile_field(self, field):
+        name, step = field.name, field.compile()
+
+        def run(array, out):
+            step(array, out[name])
+        return run
+
+    def compile_block(self, block):
+        if len(block) == 1:
+            return self.compile_field(block[0])
+        first = block[0]
+        size = sum(self.dtype.fields[field.name][0].itemsize for field in block)
+        raw_view = np.dtype({'names': ['block'], 'formats': [('u1', size)],
+                             'offsets': [self.raw_dtype.fields[first.src][1]], 'itemsize': self.raw_dtype.itemsize})
+        out_view = np.dtype({'names': ['block'], 'formats': [('u1', size)],
+                             'offsets': [self.dtype.fields[first.name][1]], 'itemsize': self.dtype.itemsize})
+
+        def run(array, out):
+            out.view(out_view)['block'] = array.view(raw_view)['block']
+        return run
+
+    def __call__(self, array):
+        if self.in_place:
+            out = np.array(array, dtype=self.dtype)
+            for step in self.steps:
+                step(out, out)
+            return out
+        out = np.empty(len(array), dtype=self.dtype)
+        for step in self.steps:
+            step(array, out)
+        return out
+
+    def columns(self, array, native=True):
+        '''
+        the converted columns as a dict of arrays instead of one record array. columns that are plain copies are
+        returned as views of the raw array (or memory map), nothing is copied. with native a copy column in an other
+        byte order is swapped into a new native array, else it is a view as well. transformed columns (times, scaled
+        values, status) are computed into new arrays, native when native is set.
+        '''
+        columns = {}
+        for field in self.fields:
+            dtype = np.dtype(field.dtype)
+            if field.is_copy and self.raw_dtype.fields[field.src][0] == dtype and (dtype.isnative or not native):
+                columns[field.name] = array[field.src]
+                continue
+            out = np.empty(len(array), dtype=dtype.newbyteorder('=') if native else dtype)
+            self.column_steps[field.name](array, out)
+            columns[field.name] = out
+        return columns
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+def arrays_in(result):
+    '''the arrays of a stage result, which can be an array, a dict of columns or the dict of dict_packing'''
+    if isinstance(result, np.ndarray):
+        return [result]
+    if isinstance(result, dict):
+        return [array for value in result.values() for array in arrays_in(value)]
+    return []
+
+
+def count_records(result):
+    if isinstance(result, np.ndarray):
+        return len(result)
+    if isinstance(result, dict):
+        for value in result.values():
+            # a dict of columns has the length of a column, the dict of dict_packing the length of its array
+            return count_records(value)
+    return 0
+
+
+def new_bytes(result, args):
+    '''bytes of the arrays in result that the stage allocated, views and the arrays passed in are not counted'''
+    total = 0
+    for array in arrays_in(result):
+        if array.flags.owndata and not isinstance(array, np.memmap) and not any(array is arg for arg in args):
+            total += array.nbytes
+    return total
+
+
+class StageStats(object):
+    '''
+    wall time, bytes read from the file, records out and bytes allocated for the result of one stage, summed over
+    its calls (one pr. chunk when streaming). peak_traced is the peak of the memory traced by tracemalloc during
+    the stage, temporaries included, when ReadBinFIle is made with trace_memory.
+    '''
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes_read = 0
+        self.records = 0
+        self.allocated = 0
+        self.peak_traced = 0
+
+    @property
+    def records_per_s(self):
+        return self.records / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self):
+        return {'name': self.name, 'calls': self.calls, 'seconds': self.seconds, 'bytes_read': self.bytes_read,
+                'records': self.records, 'allocated': self.allocated, 'peak_traced': self.peak_traced}
+
+    def __repr__(self):
+        return 'StageStats(%s, calls=%d, seconds=%.6f, bytes_read=%d, records=%d, allocated=%d)' % (
+            self.name, self.calls, self.seconds, self.bytes_read, self.records, self.allocated)
+
+
+class LoadStats(object):
+    '''stats of every stage of a load, in the order the stages first ran'''
+    def __init__(self):
+        self.stages = {}
+
+    def stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = StageStats(name)
+        return self.stages[name]
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+    @property
+    def seconds(self):
+        return sum(stage.seconds for stage in self.stages.values())
+
+    def as_dict(self):
+        return dict((name, stage.as_dict()) for name, stage in self.stages.items())
+
+    def report(self):
+        lines = ['%-12s %6s %10s %12s %14s %10s %10s' % ('stage', 'calls', 'seconds', 'records', 'records/s',
+                                                         'MB read', 'MB alloc')]
+        for stage in self.stages.values():
+            lines.append('%-12s %6d %10.4f %12d %14.0f %10.1f %10.1f' % (
+                stage.name, stage.calls, stage.seconds, stage.records, stage.records_per_s,
+                stage.bytes_read / 2.0**20, stage.allocated / 2.0**20))
+        lines.append('%-12s %6s %10.4f' % ('total', '', self.seconds))
+        return '\n'.join(lines)
@@ -0,0 +1,189 @@
+import os
+import numpy as np
+from binary_formats.formats import FORMATS, SEAPATH_POS, SEAPATH_ATTI, SEAPATH_HEADING
+from binary_formats.framing import blkcrc, record_bytes
+
+# a sunday midnight, the start of a gps week when the leap seconds are ignored
+WEEK_START = 1599955200.0
+WEEK = 7 * 86400
+VARIANTS = ['clean', 'corrupt', 'rollover']
+
+
+def motion(time):
+    '''
+    a vessel rolling, pitching and heaving on a slow turn, angles in degrees and heave in meters
+    '''
+    roll = 5.0 * np.sin(2 * np.pi * time / 8.0)
+    pitch = 2.0 * np.sin(2 * np.pi * time / 6.0)
+    heave = 0.5 * np.sin(2 * np.pi * time / 10.0)
+    heading = (time * 0.5) % 360.0
+    return roll, pitch, heave, heading
+
+
+def em3000(time, rng):
+    array = np.zeros(len(time), dtype=FORMATS['EM3000'].raw)
+    roll, pitch, heave, heading = motion(time)
+    array['status'] = rng.choice([144, 145, 160], size=len(time), p=[0.98, 0.015, 0.005])
+    array['header'] = 0x90
+    array['Roll'] = np.round(roll * 100)
+    array['Pitch'] = np.round(pitch * 100)
+    array['Heave'] = np.round(heave * 100)
+    array['Heading'] = np.round(heading * 100)
+    return array
+
+
+def seapath(time, rng, dformat):
+    array = np.zeros(len(time), dtype=FORMATS[dformat].raw)
+    roll, pitch, heave, heading = motion(time)
+    seconds = np.floor(time)
+    array['Header1'] = 0xAA
+    array['utc_time'] = seconds
+    if dformat == 'Seapath_bin26':
+        array['Header2'] = 0x51
+        array['utc_fraction'] = np.round((time - seconds) * 10**4)
+        array['delayed_heave_time'] = seconds - 100
+        array['delayed_heave_frac'] = array['utc_fraction']
+        array['delayed_heave'] = np.round(-heave * 100)
+    else:
+        array['utc_fraction'] = np.round((time - seconds) * 100)
+    array['latitude'] = np.round((60.0 + time * 1e-7 % 1) / SEAPATH_POS)
+    array['longitude'] = np.round((5.0 + time * 1e-7 % 1) / SEAPATH_POS)
+    array['height'] = np.round(rng.normal(40, 1, len(time)))
+    array['heave'] = np.round(-heave * 100)
+    array['north_vel'] = 500
+    array['east_vel'] = np.round(rng.normal(0, 10, len(time)))
+    array['roll'] = np.round(roll / SEAPATH_ATTI)
+    array['pitch'] = np.round(pitch / SEAPATH_ATTI)
+    array['heading'] = np.round(heading / SEAPATH_HEADING) % 2**16
+    array['roll_rate'] = np.round(np.gradient(roll) / SEAPATH_ATTI)
+    start = 2 if dformat == 'Seapath_bin26' else 1
+    array['checksum'] = blkcrc(record_bytes(array)[:, start:-2])
+    return array
+
+
+def vmm(time, rng):
+    array = np.zeros(len(time), dtype=FORMATS['VMM_MRU_Binary'].raw)
+    roll, pitch, heave, heading = motion(time)
+    array['Length'] = array.dtype.itemsize
+    array['Roll'] = np.deg2rad(roll)
+    array['Pitch'] = np.deg2rad(pitch)
+    array['Yaw'] = np.deg2rad((heading + 180.0) % 360.0 - 180.0)
+    array['Angular_Velocity_Roll'] = np.deg2rad(np.gradient(roll))
+    array['Linear_Velocity_Forward'] = 5.0
+    array['Linear_Acceleration_Down'] = rng.normal(0, 0.01, len(time))
+    array['fraction_time'] = np.round((time % 1) * 10**9) % 10**9
+    return array
+
+
+def kmbin(time, rng):
+    array = np.zeros(len(time), dtype=FORMATS['KMBIN'].raw)
+    roll, pitch, heave, heading = motion(time)
+    seconds = np.floor(time)
+    array['id'] = b'#KMB'
+    array['length'] = array.dtype.itemsize
+    array['version'] = 1
+    array['utc_seconds'] = seconds
+    array['utc_nanos'] = np.round((time - seconds) * 10**9) % 10**9
+    # now and then a reduced or invalid sensor group
+    bits = rng.integers(0, 32, len(time))
+    array['status'] = np.where(rng.random(len(time)) < 0.01, np.uint32(1) << bits.astype(np.uint32), 0)
+    array['latitude'] = 60.0 + time * 1e-7 % 1
+    array['longitude'] = 5.0 + time * 1e-7 % 1
+    array['height'] = rng.normal(40, 0.01, len(time))
+    array['roll'] = roll
+    array['pitch'] = pitch
+    array['heading'] = heading
+    array['heave'] = heave
+    array['north_vel'] = 5.0
+    array['latitude_error'] = 0.05
+    array['longitude_error'] = 0.05
+    array['height_error'] = 0.1
+    array['down_acceleration'] = rng.normal(0, 0.01, len(time))
+    array['delayed_seconds'] = seconds - 100
+    array['delayed_nanos'] = array['utc_nanos']
+    array['delayed_heave'] = heave
+    return array
+
+
+def sbet(time, rng):
+    array = np.zeros(len(time), dtype=FORMATS['SBET'].raw)
+    roll, pitch, heave, heading = motion(time)
+    array['utc_time'] = (time - WEEK_START) % WEEK
+    array['latitude'] = np.deg2rad(60.0 + time * 1e-7 % 1)
+    array['longitude'] = np.deg2rad(5.0 + time * 1e-7 % 1)
+    array['height'] = 40.0 + heave
+    array['x_velocity'] = 5.0
+    array['roll'] = np.deg2rad(roll)
+    array['pitch'] = np.deg2rad(pitch)
+    array['heading'] = np.deg2rad(heading)
+    array['z_acceleration'] = rng.normal(0, 0.01, len(time))
+    return array
+
+
+def pfreeheave(time, rng):
+    array = np.zeros(len(time), dtype=FORMATS['PFreeHeave'].raw)
+    heave = motion(time)[2]
+    seconds = np.floor(time)
+    array['Header1'] = 0xAA
+    array['Header2'] = 0x51
+    array['posix'] = seconds
+    array['fraction'] = np.round((time - seconds) * 10**4)
+    array['heave'] = np.round(heave * 100)
+    array['checksum'] = blkcrc(record_bytes(array)[:, 2:-2])
+    return array
+
+
+GENERATORS = {'EM3000': em3000, 'Seapath_bin11': lambda time, rng: seapath(time, rng, 'Seapath_bin11'),
+              'Seapath_bin26': lambda time, rng: seapath(time, rng, 'Seapath_bin26'), 'VMM_MRU_Binary': vmm,
+              'KMBIN': kmbin, 'SBET': sbet, 'PFreeHeave': pfreeheave}
+
+
+def make_records(dformat, count, first=0, start=WEEK_START + 3600, rate=100.0, seed=0):
+    '''
+    deterministic raw records of a format, record i is sampled at start + i / rate. the random parts are seeded
+    by seed and first, so the same call always gives the same records.
+    '''
+    rng = np.random.default_rng([seed, first])
+    time = start + np.arange(first, first + count) / float(rate)
+    return GENERATORS[dformat](time, rng)
+
+
+def corrupt(data, rng, rate=1e-5):
+    '''
+    damage a block of bytes the way a serial link does, flipped bytes, dropped bytes and inserted junk.
+    rate is the probability of each of them pr. byte.
+    '''
+    data = np.frombuffer(data, dtype=np.uint8).copy()
+    count = rng.binomial(len(data), rate)
+    flip = rng.integers(0, len(data), count)
+    data[flip] ^= rng.integers(1, 256, count, dtype=np.uint8)
+    data = np.delete(data, rng.integers(0, len(data), rng.binomial(len(data), rate)))
+    count = rng.binomial(len(data), rate)
+    junk = rng.integers(0, 256, count, dtype=np.uint8)
+    return np.insert(data, rng.integers(0, len(data), count), junk).tobytes()
+
+
+def write_file(filename, dformat, size, variant='clean', seed=0, rate=100.0, chunk_records=2**18):
+    '''
+    write a synthetic log of about size bytes. the file is written in chunks so it can be larger than memory.
+    :param variant: 'clean', 'corrupt' for damaged bytes or 'rollover' where the time crosses midnight and the
+    end of the gps week half way through the file
+    :return: number of records written
+    '''
+    if variant not in VARIANTS:
+        raise ValueError('variant must be one of %s' % ', '.join(VARIANTS))
+    itemsize = np.dtype(FORMATS[dformat].raw).itemsize
+    total = max(int(size) // itemsize, 1)
+    start = WEEK_START + 3600
+    if variant == 'rollover':
+        start = WEEK_START + WEEK - total / (2 * rate)
+    rng = np.random.default_rng([seed, 1])
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as fobj:
+        for first in range(0, total, chunk_records):
+            data = make_records(dformat, min(chunk_records, total - first), first, start, rate, seed).tobytes()
+            if variant == 'corrupt':
+                data = corrupt(data, rng)
+            fobj.write(data)
+    os.replace(tmp, filename)
+    return total
@@ -0,0 +1,56 @@
+import numpy as np
+from binary_formats.align import StreamAligner, clock, interpolate, merge
+
+
+def samples(time, **columns):
+    dtype = [('utc_time', 'f8')] + [(name, np.asarray(values).dtype) for name, values in columns.items()]
+    array = np.empty(len(time), dtype=dtype)
+    array['utc_time'] = time
+    for name, values in columns.items():
+        array[name] = values
+    return array
+
+
+def chunked(array, size):
+    return [array[start:start + size] for start in range(0, len(array), size)]
+
+
+def test_angles_take_the_shortest_arc():
+    array = samples([0.0, 1.0], heading=[359.0, 1.0], Yaw=[179.0, -179.0])
+    out = interpolate(array, [0.25, 0.5, 0.75])
+    assert np.allclose(out['heading'], [359.5, 0.0, 0.5])
+    # yaw stays in -180 to 180
+    assert np.allclose(out['Yaw'], [179.5, -180.0, -179.5])
+
+
+def test_gaps_longer_than_max_gap_are_nan():
+    array = samples([0.0, 1.0, 10.0, 11.0], roll=[0.0, 1.0, 10.0, 11.0])
+    out = interpolate(array, [-1.0, 0.5, 5.0, 10.5, 12.0], max_gap=2.0)
+    assert np.isnan(out['roll'][[0, 2, 4]]).all()
+    assert np.allclose(out['roll'][[1, 3]], [0.5, 10.5])
+
+
+def test_integer_columns_hold_the_sample_before():
+    array = samples([0.0, 1.0, 2.0], status=np.array([1, 2, 3], dtype=np.uint8))
+    out = interpolate(array, [0.5, 1.0, 1.9])
+    assert out['status'].dtype == np.uint8
+    assert list(out['status']) == [1, 2, 2]
+
+
+def test_stream_aligner_is_merge():
+    time = np.arange(0.0, 100.0, 0.01)
+    mru = samples(time, roll=np.sin(time), heading=time * 7 % 360, status=(time * 3).astype(np.int32))
+    gps_time = np.arange(0.005, 100.0, 0.1)
+    gps = samples(gps_time, height=np.cos(gps_time))
+    times = np.concatenate(list(clock(0.0, 100.0, 25.0, chunk_size=333)))
+    expected = merge({'mru': mru, 'gps': gps}, times, max_gap=0.5)
+    aligner = StreamAligner({'mru': chunked(mru, 700), 'gps': chunked(gps, 90)}, max_gap=0.5)
+    aligned = np.concatenate(list(aligner.align(clock(0.0, 100.0, 25.0, chunk_size=333))))
+    assert aligned.dtype == expected.dtype
+    for name in expected.dtype.names:
+        assert np.array_equal(aligned[name], expected[name], equal_nan=expected[name].dtype.kind == 'f')
+    # dict of columns chunks, as iter_chunks gives with zero_copy
+    columns = [dict((name, chunk[name]) for name in chunk.dtype.names) for chunk in chunked(mru, 700)]
+    aligner = StreamAligner({'mru': columns, 'gps': chunked(gps, 90)}, max_gap=0.5)
+    aligned = np.concatenate(list(aligner.align(clock(0.0, 100.0, 25.0, chunk_size=333))))
+    assert aligned.tobytes() == expected.tobytes()
@@ -0,0 +1,9 @@
+import pytest
+from binary_formats.batch import load_files
+
+
+def test_no_files_is_an_error(tmp_path):
+    with pytest.raises(ValueError):
+        load_files([])
+    with pytest.raises(ValueError):
+        load_files(str(tmp_path / '*.bin'))
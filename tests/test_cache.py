@@ -0,0 +1,19 @@
+import os
+from binary_formats.cache import ArrayCache
+from binary_formats.reader import ReadBinFIle
+from binary_formats.synthetic import make_records
+
+
+def test_only_entries_of_a_changed_file_are_stale(tmp_path):
+    filename = str(tmp_path / 'seapath.bin')
+    records = make_records('Seapath_bin26', 1001)
+    records[:1000].tofile(filename)
+    cache = ArrayCache(str(tmp_path / 'cache'))
+    ReadBinFIle(filename, 'Seapath_bin26', cache=cache).run()
+    ReadBinFIle(filename, 'Seapath_bin26', cache=cache, fields=['utc_time', 'roll']).run()
+    assert len(cache.entries()) == 2
+    with open(filename, 'ab') as fobj:
+        fobj.write(records[1000:].tobytes())
+    os.utime(filename, ns=(0, os.stat(filename).st_mtime_ns + 1))
+    ReadBinFIle(filename, 'Seapath_bin26', cache=cache).run()
+    assert len(cache.entries()) == 1
@@ -0,0 +1,79 @@
+import numpy as np
+from binary_formats.batch import load_files
+from binary_formats.container import HEADER
+from binary_formats.follow import FileFollower
+from binary_formats.formats import FORMATS
+from binary_formats.framing import extract
+from binary_formats.reader import DetectFormat, ReadBinFIle
+from binary_formats.synthetic import make_records
+
+
+def interleaved(records, every=3):
+    '''#KMB records with a record of an other type and length after every few of them'''
+    other = np.zeros(1, dtype=HEADER)
+    other['id'] = b'#KMX'
+    other['length'] = 8 + 30
+    other['version'] = 1
+    parts = []
+    for i in range(len(records)):
+        parts.append(records[i:i + 1].tobytes())
+        if i % every == 0:
+            parts.append(other.tobytes() + bytes(range(30)))
+    return b''.join(parts)
+
+
+def test_every_path_reads_the_kmb_records(tmp_path):
+    records = make_records('KMBIN', 2000, start=1.6e9)
+    filename = str(tmp_path / 'kmb.bin')
+    with open(filename, 'wb') as fobj:
+        fobj.write(interleaved(records))
+    assert DetectFormat(filename).run() == 'KMBIN'
+    full = ReadBinFIle(filename, 'KMBIN').run()['KMBIN']
+    assert np.array_equal(full['utc_time'], records['utc_seconds'] + records['utc_nanos'] / 10.0**9)
+    chunks = np.concatenate(list(ReadBinFIle(filename, 'KMBIN', chunk_size=300).iter_chunks()))
+    assert chunks.tobytes() == full.tobytes()
+    start, end = full['utc_time'][500], full['utc_time'][1499]
+    window = ReadBinFIle(filename, 'KMBIN', start=start, end=end).run()['KMBIN']
+    assert window.tobytes() == full[500:1500].tobytes()
+    columns = ReadBinFIle(filename, 'KMBIN', zero_copy=True).run()['KMBIN']
+    assert np.array_equal(columns['roll'], full['roll'])
+
+
+def test_follower_keeps_partial_records(tmp_path):
+    records = make_records('KMBIN', 500, start=1.6e9)
+    data = interleaved(records)
+    filename = str(tmp_path / 'kmb.bin')
+    open(filename, 'wb').close()
+    follower = FileFollower(filename, 'KMBIN')
+    arrays = []
+    for start in range(0, len(data), 1000):
+        with open(filename, 'ab') as fobj:
+            fobj.write(data[start:start + 1000])
+        arrays.append(follower.poll())
+    assert np.array_equal(np.concatenate(arrays)['roll'], records['roll'])
+
+
+def test_grid_first_frame_matches_the_header_scan():
+    fmt = FORMATS['KMBIN']()
+    fmt.scan_bytes = 2**17
+    records = make_records('KMBIN', 20000, start=1.6e9)
+    data = bytearray(records.tobytes())
+    size = records.dtype.itemsize
+    # an interleaved stretch, a lost byte and junk in the middle of clean stretches
+    data[5000 * size:5000 * size] = interleaved(records[:50])
+    del data[12000 * size + 7]
+    data[16000 * size:16000 * size] = b'#KM' + bytes(range(200))
+    data = np.frombuffer(bytes(data), dtype=np.uint8)
+    framed, stats = fmt.frame(data)
+    table = fmt.record_table(data)[0]
+    assert len(framed) == len(table) == 20000 + 50 - 1
+    assert np.array_equal(framed['utc_nanos'], extract(data, table['offset'], fmt.sp_dtype)['utc_nanos'])
+
+
+def test_batch_reads_an_interleaved_log(tmp_path):
+    records = make_records('KMBIN', 1000, start=1.6e9)
+    filename = str(tmp_path / 'kmb.bin')
+    with open(filename, 'wb') as fobj:
+        fobj.write(interleaved(records))
+    array = load_files([filename], 'KMBIN', max_workers=1)['KMBIN']
+    assert np.array_equal(array['roll'], records['roll'])
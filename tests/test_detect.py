@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from binary_formats.formats import FORMATS
+from binary_formats.reader import DetectFormat
+from binary_formats.synthetic import make_records
+
+
+def nmea(count):
+    '''gga sentences with a counting time, text that steps like a time stamp'''
+    return b''.join(b'$GPGGA,%06d.00,6000.%04d,N,00500.0000,E,1,08,0.9,40.0,M,0.0,M,,*47\r\n' % (i, i % 10000)
+                    for i in range(count))
+
+
+@pytest.mark.parametrize('dformat', sorted(FORMATS))
+def test_every_format_is_detected(dformat):
+    # bytes in front of the first record, as when logging starts in the middle of a telegram
+    data = b'\x00' * 7 + make_records(dformat, 3000, start=1.6e9).tobytes()
+    name, confidence = DetectFormat(data, mode='Bytes').detect()
+    assert name == dformat
+    assert confidence > 0.8
+
+
+RANDOM = np.random.default_rng(0).integers(0, 256, 2**16, dtype=np.uint8).tobytes()
+
+
+@pytest.mark.parametrize('data', [bytes(2**16), RANDOM, nmea(2000)], ids=['zeros', 'random', 'text'])
+def test_other_data_is_not_detected(data):
+    detector = DetectFormat(data, mode='Bytes')
+    with pytest.raises(TypeError):
+        detector.detect()
+    assert max(detector.scores.values()) < 0.1
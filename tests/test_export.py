@@ -0,0 +1,14 @@
+import numpy as np
+from binary_formats.export import export, read_export
+from binary_formats.reader import ReadBinFIle
+from binary_formats.synthetic import make_records
+
+
+def test_zero_copy_export(tmp_path):
+    filename = str(tmp_path / 'kmb.bin')
+    make_records('KMBIN', 5000).tofile(filename)
+    export(filename, str(tmp_path / 'out'), 'KMBIN', downcast=False, zero_copy=True, chunk_size=1000)
+    exported = read_export(str(tmp_path / 'out'))
+    array = ReadBinFIle(filename, 'KMBIN').run()['KMBIN']
+    for name in array.dtype.names:
+        assert np.array_equal(exported[name], array[name])
@@ -0,0 +1,24 @@
+import os
+import numpy as np
+from binary_formats.follow import FileFollower
+from binary_formats.synthetic import make_records
+
+
+def test_replaced_file_is_read_from_the_start(tmp_path):
+    records = make_records('Seapath_bin26', 300, start=1.6e9)
+    filename = str(tmp_path / 'log.bin')
+    with open(filename, 'wb') as fobj:
+        # ends in a partial record
+        fobj.write(records[:100].tobytes() + records[100:101].tobytes()[:9])
+    follower = FileFollower(filename, 'Seapath_bin26', resync=True)
+    assert len(follower.poll()) == 100
+    # the new log is longer than the old one, only the inode tells them apart
+    replacement = str(tmp_path / 'new.bin')
+    with open(replacement, 'wb') as fobj:
+        fobj.write(records[100:300].tobytes())
+    os.replace(replacement, filename)
+    array = follower.poll()
+    expected = follower.fmt.convert_array(records[100:300])
+    assert np.array_equal(array['utc_time'], expected['utc_time'])
+    assert follower.frame_stats.records == 200
+    assert follower.frame_stats.skipped_bytes == 0
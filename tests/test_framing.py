@@ -0,0 +1,103 @@
+import numpy as np
+from binary_formats.follow import FileFollower
+from binary_formats.framing import Framer
+from binary_formats.formats import FORMATS
+from binary_formats.reader import ReadBinFIle
+from binary_formats.synthetic import make_records
+
+
+def frame(dformat, records):
+    return Framer(FORMATS[dformat]()).frame(records.tobytes())
+
+
+def test_vmm_steady_roll_keeps_every_record(tmp_path):
+    # the first telegrams share the leading byte of Roll, which is data and no sync
+    records = make_records('VMM_MRU_Binary', 100000)
+    records['Roll'][:64] = 0.09
+    framed, stats = frame('VMM_MRU_Binary', records)
+    assert len(framed) == len(records)
+    assert stats.skipped_records == 0
+    filename = str(tmp_path / 'vmm.bin')
+    records.tofile(filename)
+    array = ReadBinFIle(filename, 'VMM_MRU_Binary', resync=True).run()['VMM_MRU_Binary']
+    assert len(array) == len(records)
+
+
+def test_em3000_status_is_no_sync():
+    records = make_records('EM3000', 100000)
+    records['status'][:64] = 144
+    framed, stats = frame('EM3000', records)
+    assert len(framed) == len(records)
+    assert np.array_equal(framed['status'], records['status'])
+    assert set(np.unique(framed['status'])) == {144, 145, 160}
+
+
+def test_em3000_resync_after_lost_byte():
+    records = make_records('EM3000', 1000)
+    data = records.tobytes()
+    data = data[:5000] + data[5001:]
+    framed, stats = Framer(FORMATS['EM3000']()).frame(data)
+    assert len(framed) == len(records) - 1
+    assert stats.skipped_records == 1
+
+
+def test_clean_log_is_the_record_grid():
+    records = make_records('Seapath_bin26', 50000)
+    framed, stats = frame('Seapath_bin26', records)
+    assert framed.tobytes() == records.tobytes()
+    assert stats.rejected == 0 and stats.skipped_bytes == 0
+
+
+def test_grid_resumes_after_damage():
+    records = make_records('Seapath_bin26', 50000)
+    data = bytearray(records.tobytes())
+    size = records.dtype.itemsize
+    data[100 * size + 10] ^= 0xFF  # checksum error, the grid holds
+    del data[30000 * size + 3]  # lost byte, the grid moves
+    framed, stats = Framer(FORMATS['Seapath_bin26']()).frame(bytes(data))
+    expected = np.delete(records, [100, 30000])
+    assert framed.tobytes() == expected.tobytes()
+    assert stats.skipped_records == 2
+
+
+def test_resync_chunks_match_run(tmp_path):
+    records = make_records('Seapath_bin26', 20000)
+    data = bytearray(records.tobytes())
+    size = records.dtype.itemsize
+    for record in (5000, 12000):
+        del data[record * size + 3]
+    filename = str(tmp_path / 'seapath.bin')
+    with open(filename, 'wb') as fobj:
+        fobj.write(bytes(data))
+    reader = ReadBinFIle(filename, 'Seapath_bin26', resync=True)
+    array = reader.run()['Seapath_bin26']
+    chunked = ReadBinFIle(filename, 'Seapath_bin26', resync=True, chunk_size=3000)
+    chunks = list(chunked.iter_chunks())
+    assert max(len(chunk) for chunk in chunks) <= 3000
+    assert np.array_equal(np.concatenate(chunks)['utc_time'], array['utc_time'])
+    assert len(array) == len(records) - 2
+    assert chunked.frame_stats.skipped_records == reader.frame_stats.skipped_records == 2
+
+
+def test_sbet_without_sync_resyncs_at_any_byte(tmp_path):
+    records = make_records('SBET', 5000)
+    data = bytearray(records.tobytes())
+    size = records.dtype.itemsize
+    for record in (1000, 3000):
+        del data[record * size + 5]
+    filename = str(tmp_path / 'sbet.bin')
+    with open(filename, 'wb') as fobj:
+        fobj.write(bytes(data))
+    array = ReadBinFIle(filename, 'SBET', resync=True).run()['SBET']
+    assert np.array_equal(array['utc_time'], np.delete(records, [1000, 3000])['utc_time'])
+    chunks = ReadBinFIle(filename, 'SBET', resync=True, chunk_size=700).iter_chunks()
+    assert np.array_equal(np.concatenate(list(chunks))['utc_time'], array['utc_time'])
+    followed = str(tmp_path / 'followed.bin')
+    open(followed, 'wb').close()
+    follower = FileFollower(followed, 'SBET', resync=True)
+    arrays = []
+    for start in range(0, len(data), 10000):
+        with open(followed, 'ab') as fobj:
+            fobj.write(bytes(data[start:start + 10000]))
+        arrays.append(follower.poll())
+    assert np.array_equal(np.concatenate(arrays)['utc_time'], array['utc_time'])
@@ -0,0 +1,70 @@
+import asyncio
+import socket
+import numpy as np
+from binary_formats.live import TelegramBatcher, listen_udp
+from binary_formats.synthetic import make_records
+
+
+def receive(batcher, datagrams, wait=0.3):
+    '''send the datagrams to a batcher listening on a local udp port, the batches it delivers'''
+    batches = []
+    batcher.subscribe(batches.append)
+
+    async def main():
+        transport = await listen_udp(batcher, 0, host='127.0.0.1')
+        port = transport.get_extra_info('sockname')[1]
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for datagram in datagrams:
+            sender.sendto(datagram, ('127.0.0.1', port))
+        sender.close()
+        await asyncio.sleep(wait)
+        transport.close()
+
+    asyncio.run(main())
+    return batches
+
+
+def test_batches_hold_the_sent_records():
+    records = make_records('Seapath_bin26', 200, start=1.6e9)
+    batcher = TelegramBatcher('Seapath_bin26', batch_size=64, max_latency=0.05)
+    batches = receive(batcher, [records[i:i + 10].tobytes() for i in range(0, len(records), 10)])
+    # three full batches and the rest after max_latency
+    assert [len(batch) for batch in batches] == [64, 64, 64, 8]
+    expected = batcher.fmt.convert_array(records)
+    assert np.array_equal(np.concatenate(batches)['utc_time'], expected['utc_time'])
+    assert np.array_equal(np.concatenate(batches)['roll'], expected['roll'])
+
+
+def test_batch_goes_out_after_max_latency():
+    records = make_records('Seapath_bin26', 20, start=1.6e9)[:10]
+    batcher = TelegramBatcher('Seapath_bin26', batch_size=1024, max_latency=0.05)
+    batches = receive(batcher, [records.tobytes()])
+    assert len(batches) == 1 and len(batches[0]) == 10
+    assert batcher.fill == 0
+
+
+def test_datagrams_of_an_other_length_are_dropped():
+    records = make_records('Seapath_bin26', 20, start=1.6e9)
+    broken = records[:3].tobytes()[:-5]
+    batcher = TelegramBatcher('Seapath_bin26', max_latency=0.05)
+    batches = receive(batcher, [broken, records[3:8].tobytes()])
+    assert batcher.stats.dropped_packets == 1
+    assert batcher.stats.dropped_bytes == len(broken)
+    assert np.array_equal(np.concatenate(batches)['utc_time'],
+                          batcher.fmt.convert_array(records[3:8])['utc_time'])
+
+
+def test_resync_keeps_a_partial_telegram_across_flush():
+    records = make_records('Seapath_bin26', 20, start=1.6e9)
+    data = b'\x00\x17' + records.tobytes()
+    batcher = TelegramBatcher('Seapath_bin26', max_latency=None, resync=True)
+    cut = 2 + 7 * records.dtype.itemsize + 11
+    batcher.feed(data[:cut])
+    first = batcher.flush()
+    assert len(first) == 7
+    assert batcher.fill == 11
+    batcher.feed(data[cut:])
+    second = batcher.flush()
+    assert np.array_equal(np.concatenate([first, second])['utc_time'],
+                          batcher.fmt.convert_array(records)['utc_time'])
+    assert batcher.stats.dropped_bytes == 2
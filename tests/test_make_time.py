@@ -0,0 +1,52 @@
+import datetime
+import numpy as np
+import pytest
+from binary_formats.formats import FORMATS
+from binary_formats.overview import build_overview
+from binary_formats.reader import ReadBinFIle
+from binary_formats.synthetic import make_records
+
+START = datetime.datetime(2020, 9, 13, 1, 0, 0)
+
+
+def em3000_times(date_time, **kwargs):
+    fmt = FORMATS['EM3000']()
+    array = fmt.convert_array(make_records('EM3000', 1000))
+    fmt.make_time(array, date_time, **kwargs)
+    return array['utc_time']
+
+
+def test_em3000_start_forms_agree():
+    expected = em3000_times((2020, 9, 13, 1, 0, 0, 0.01))
+    epoch = (START - datetime.datetime(1970, 1, 1)).total_seconds()
+    assert np.array_equal(em3000_times((START, 0.01)), expected)
+    assert np.array_equal(em3000_times(START, interval=0.01), expected)
+    assert np.array_equal(em3000_times(epoch, interval=0.01), expected)
+
+
+def test_em3000_start_alone_needs_interval():
+    with pytest.raises(ValueError):
+        em3000_times(START)
+
+
+def test_em3000_window_is_sliced_by_record_number(tmp_path):
+    filename = str(tmp_path / 'em3000.bin')
+    make_records('EM3000', 5000).tofile(filename)
+    date_time = (START, 0.01)
+    full = ReadBinFIle(filename, 'EM3000', date_time=date_time).run()['EM3000']
+    start, end = full['utc_time'][1234], full['utc_time'][4321]
+    # small blocks, the running sum of the interval has to go on across them
+    assert FORMATS['EM3000']().time_slice(len(full), date_time, start, end, block_size=1000)[:2] == (1234, 4322)
+    window = ReadBinFIle(filename, 'EM3000', date_time=date_time, start=start, end=end).run()['EM3000']
+    assert window.tobytes() == full[1234:4322].tobytes()
+
+
+def test_overview_reads_full_resolution_only_with_a_window(tmp_path):
+    for dformat in ('EM3000', 'VMM_MRU_Binary'):
+        filename = str(tmp_path / (dformat + '.bin'))
+        make_records(dformat, 5000).tofile(filename)
+        overview = build_overview(filename, dformat, date_time=(START, 0.01))
+        bins = overview.levels[0]
+        samples, array = overview.query(bins['start'][10], bins['end'][12], npoints=2000)
+        # the counter time of VMM_MRU_Binary is only known by converting the whole file
+        assert samples == (1 if dformat == 'EM3000' else overview.base)
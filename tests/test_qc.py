@@ -0,0 +1,46 @@
+import numpy as np
+from binary_formats.qc import BACKWARDS, DUPLICATE, GAP, INVALID, REDUCED, SPIKE, QualityControl, run_qc
+
+
+def faulty(count=1000):
+    '''100 Hz samples with one fault of every kind'''
+    array = np.zeros(count, dtype=[('utc_time', 'f8'), ('roll', 'f4'), ('status_roll_pitch', '<u4')])
+    time = np.arange(count) * 0.01
+    time[300:] += 0.5
+    time[500] = time[499]
+    time[700] = time[699] - 0.001
+    array['utc_time'] = time
+    array['roll'] = np.sin(np.arange(count) * 0.01)
+    array['roll'][800] += 5.0
+    array['status_roll_pitch'][100:105] = 1
+    array['status_roll_pitch'][105:108] = 2
+    return array
+
+
+def table(report):
+    return sorted((int(event['start']), int(event['end']), int(event['code']), str(event['field']))
+                  for event in report.events)
+
+
+def test_injected_faults_are_the_events():
+    report = run_qc(faulty(), status=['status_roll_pitch'])
+    assert table(report) == [(100, 105, REDUCED, 'status_roll_pitch'), (105, 108, INVALID, 'status_roll_pitch'),
+                             (299, 301, GAP, 'utc_time'), (499, 501, DUPLICATE, 'utc_time'),
+                             (699, 701, BACKWARDS, 'utc_time'), (799, 802, SPIKE, 'roll')]
+    summary = report.summary
+    assert summary['records'] == 1000
+    assert np.isclose(summary['largest_gap'], 0.51)
+    assert summary['degraded_samples'] == {'reduced status_roll_pitch': 5, 'invalid status_roll_pitch': 3}
+    assert summary['spikes'] == {'roll': 1}
+
+
+def test_chunks_give_the_events_of_the_whole_array():
+    array = faulty()
+    whole = run_qc(array, status=['status_roll_pitch'], interval=0.01)
+    for size in (1, 97, 300):
+        qc = QualityControl(status=['status_roll_pitch'], interval=0.01)
+        for start in range(0, len(array), size):
+            qc.update(array[start:start + size])
+        chunked = qc.finish()
+        assert table(chunked) == table(whole)
+        assert chunked.summary == whole.summary
@@ -0,0 +1,44 @@
+import os
+import numpy as np
+from binary_formats.reader import ReadBinFIle
+from binary_formats.synthetic import make_records
+
+
+def write(tmp_path, dformat, count):
+    filename = str(tmp_path / (dformat + '.bin'))
+    make_records(dformat, count, start=1.6e9).tofile(filename)
+    return filename
+
+
+def test_only_the_stages_that_apply_are_recorded(tmp_path):
+    filename = write(tmp_path, 'Seapath_bin26', 1000)
+    called = []
+    reader = ReadBinFIle(filename, 'Seapath_bin26', callbacks=[lambda stage: called.append(stage.name)])
+    reader.run()
+    # no date_time, cache, window or fields
+    assert called == ['set_format', 'parse_bin', 'convert', 'dict_packing']
+    assert list(reader.stats.stages) == called
+    assert reader.stats['parse_bin'].records == reader.stats['convert'].records == 1000
+    assert reader.stats['parse_bin'].bytes_read == os.path.getsize(filename)
+
+
+def test_make_time_and_window_are_counted_when_they_apply(tmp_path):
+    filename = write(tmp_path, 'EM3000', 1000)
+    date_time = (1.6e9, 0.01)
+    full = ReadBinFIle(filename, 'EM3000', date_time=date_time).run()['EM3000']
+    reader = ReadBinFIle(filename, 'EM3000', date_time=date_time, start=full['utc_time'][100],
+                         end=full['utc_time'][399], profile=True)
+    reader.run()
+    stats = reader.stats
+    assert stats['window'].records == stats['convert'].records == stats['make_time'].records == 300
+    assert stats['select'].records == 300
+
+
+def test_streamed_stages_are_summed_over_the_chunks(tmp_path):
+    filename = write(tmp_path, 'Seapath_bin26', 1000)
+    reader = ReadBinFIle(filename, 'Seapath_bin26', chunk_size=300, profile=True)
+    chunks = list(reader.iter_chunks())
+    assert reader.stats['convert'].calls == len(chunks) == 4
+    assert reader.stats['convert'].records == sum(len(chunk) for chunk in chunks) == 1000
+    assert 'make_time' not in reader.stats.stages and 'select' not in reader.stats.stages
+    assert np.isclose(reader.stats.seconds, sum(stage.seconds for stage in reader.stats.stages.values()))
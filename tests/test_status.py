@@ -0,0 +1,31 @@
+import numpy as np
+from binary_formats.formats import FORMATS, KMB_STATUS_BITS
+from binary_formats.synthetic import make_records
+
+NAMES = [name for name, _, _ in KMB_STATUS_BITS]
+
+
+def test_every_status_bit_alone():
+    fmt = FORMATS['KMBIN']()
+    for name, invalid, reduced in KMB_STATUS_BITS:
+        decoded = fmt.decode_status([1 << invalid, 1 << reduced, (1 << invalid) | (1 << reduced)])
+        # invalid takes precedence over reduced
+        assert list(decoded[name]) == [2, 1, 2]
+        for other in NAMES:
+            if other != name:
+                assert list(decoded[other]) == [0, 0, 0]
+    # bits outside the sensor groups
+    decoded = fmt.decode_status((1 << 10) | (1 << 31))
+    assert all(decoded[name][0] == 0 for name in NAMES)
+
+
+def test_read_line_decodes_the_status_of_a_telegram():
+    fmt = FORMATS['KMBIN']()
+    record = make_records('KMBIN', 10, start=1.6e9)[:1].copy()
+    # roll and pitch invalid, heading reduced, delayed heave invalid and reduced
+    record['status'] = (1 << 1) | (1 << 18) | (1 << 5) | (1 << 21)
+    converted = fmt.read_line(record.tobytes())
+    expected = {'status_horiz_pos_vel': 0, 'status_roll_pitch': 2, 'status_heading': 1, 'status_heave_vec': 0,
+                'status_acceleration': 0, 'status_delayed': 2}
+    assert dict((name, int(converted[name][0])) for name in NAMES) == expected
+    assert np.array_equal(converted['roll'], record['roll'])